@@ -6,6 +6,7 @@ import logging
 
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.util.dt import utcnow
 from homeassistant import config_entries
 from homeassistant.const import (
@@ -17,6 +18,7 @@ from homeassistant.const import (
 )
 
 from .audi_account import AudiAccount
+from .discovery_cache import DISCOVERY_CACHE
 
 from .const import (
     DOMAIN,
@@ -28,6 +30,10 @@ from .const import (
     MIN_UPDATE_INTERVAL,
     RESOURCES,
     COMPONENTS,
+    STORAGE_KEY_DISCOVERY,
+    STORAGE_KEY_SESSION,
+    STORAGE_KEY_TRIPS,
+    STORAGE_VERSION,
     CONF_API_LEVEL,
     DEFAULT_API_LEVEL,
     API_LEVELS,
@@ -113,6 +119,12 @@ async def async_setup_entry(hass, config_entry):
     """Set up the Audi Connect component."""
     hass.data[DOMAIN]["devices"] = set()
 
+    # The discovery documents are shared by all config entries
+    if not DISCOVERY_CACHE.has_store:
+        await DISCOVERY_CACHE.attach_store(
+            Store(hass, STORAGE_VERSION, STORAGE_KEY_DISCOVERY)
+        )
+
     # Attempt to retrieve the scan interval from options, then fall back to data, or use default
     scan_interval = timedelta(
         minutes=config_entry.options.get(
@@ -138,6 +150,14 @@ async def async_setup_entry(hass, config_entry):
     else:
         data = hass.data[DOMAIN][account]
 
+    # Owned by the config entry, so it is cancelled when the entry is
+    # unloaded or its setup fails
+    data.connection.start_token_manager(
+        lambda coro: config_entry.async_create_background_task(
+            hass, coro, "audiconnect token manager"
+        )
+    )
+
     # Define a callback function for the timer to update data
     async def update_data(now):
         """Update the data with the latest information."""
@@ -174,6 +194,8 @@ async def async_unload_entry(hass, config_entry):
 
     data = hass.data[DOMAIN][account]
 
+    await data.connection.stop_token_manager()
+
     for component in COMPONENTS:
         await hass.config_entries.async_forward_entry_unload(
             data.config_entry, component
@@ -182,3 +204,11 @@ async def async_unload_entry(hass, config_entry):
     del hass.data[DOMAIN][account]
 
     return True
+
+
+async def async_remove_entry(hass, config_entry):
+    """Remove the stored session and trips of a deleted config entry."""
+    for key in (STORAGE_KEY_SESSION, STORAGE_KEY_TRIPS):
+        await Store(
+            hass, STORAGE_VERSION, key.format(config_entry.entry_id)
+        ).async_remove()
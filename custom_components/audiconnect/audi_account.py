@@ -8,6 +8,8 @@ from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
 from homeassistant.util.dt import utcnow
 
 from .audi_connect_account import AudiConnectAccount, AudiConnectObserver
@@ -33,6 +35,13 @@ from .const import (
     CONF_API_LEVEL,
     DEFAULT_API_LEVEL,
     API_LEVELS,
+    CONF_STATUS_SHARDS,
+    DEFAULT_STATUS_SHARDS,
+    CONF_VEHICLE_CONCURRENCY,
+    DEFAULT_VEHICLE_CONCURRENCY,
+    STORAGE_KEY_SESSION,
+    STORAGE_KEY_TRIPS,
+    STORAGE_VERSION,
 )
 from .dashboard import Dashboard
 
@@ -108,6 +117,24 @@ class AudiAccount(AudiConnectObserver):
                     CONF_API_LEVEL, API_LEVELS[DEFAULT_API_LEVEL]
                 ),
             ),
+            max_concurrent_vehicles=self.config_entry.options.get(
+                CONF_VEHICLE_CONCURRENCY, DEFAULT_VEHICLE_CONCURRENCY
+            ),
+            status_shards=self.config_entry.options.get(
+                CONF_STATUS_SHARDS, DEFAULT_STATUS_SHARDS
+            ),
+            token_store=Store(
+                self.hass,
+                STORAGE_VERSION,
+                STORAGE_KEY_SESSION.format(self.config_entry.entry_id),
+                private=True,
+            ),
+            trip_store=Store(
+                self.hass,
+                STORAGE_VERSION,
+                STORAGE_KEY_TRIPS.format(self.config_entry.entry_id),
+                private=True,
+            ),
         )
 
         self.hass.services.async_register(
@@ -187,16 +214,40 @@ class AudiAccount(AudiConnectObserver):
                 self.config_entry, PLATFORMS
             )
 
+    def update_disabled_attributes(self):
+        """Pass the attributes of disabled entities on to the connection."""
+        registry = er.async_get(self.hass)
+        for config_vehicle in self.config_vehicles:
+            disabled = set()
+            for instrument in (
+                *config_vehicle.sensors,
+                *config_vehicle.binary_sensors,
+                *config_vehicle.switches,
+                *config_vehicle.device_trackers,
+                *config_vehicle.locks,
+                *config_vehicle.climates,
+            ):
+                entity_id = registry.async_get_entity_id(
+                    instrument.component, DOMAIN, instrument.full_name
+                )
+                entry = registry.async_get(entity_id) if entity_id else None
+                if entry is not None and entry.disabled:
+                    disabled.add(instrument.attr)
+            self.connection.set_disabled_attributes(
+                config_vehicle.vehicle.vin, disabled
+            )
+
     async def update(self, now):
         """Update status from the cloud."""
         _LOGGER.debug("Starting refresh cloud data...")
+        self.update_disabled_attributes()
         if not await self.connection.update(None):
             _LOGGER.warning("Failed refresh cloud data")
             return False
 
         # Discover new vehicles that have not been added yet
         new_vehicles = [
-            x for x in self.connection._vehicles if x.vin not in self.vehicles
+            x for x in self.connection._vehicles.values() if x.vin not in self.vehicles
         ]
         if new_vehicles:
             _LOGGER.debug("Retrieved %d vehicle(s)", len(new_vehicles))
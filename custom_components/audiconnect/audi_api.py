@@ -1,50 +1,430 @@
 import json
 import logging
-from datetime import datetime
+import random
+import re
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 import asyncio
 
 from asyncio import TimeoutError, CancelledError
-from aiohttp import ClientResponseError
+from aiohttp import ClientConnectionError, ClientResponseError
 from aiohttp.hdrs import METH_GET, METH_POST, METH_PUT
 
-from typing import Dict
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from .util import join_flight
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 TIMEOUT = 30
 
+# Adaptive timeouts: once an endpoint has LATENCY_MIN_SAMPLES completed
+# requests, its timeout is p99 of the recent latencies times
+# LATENCY_TIMEOUT_FACTOR, limited to TIMEOUT_FLOOR..TIMEOUT_CEILING
+LATENCY_SAMPLES = 100
+LATENCY_MIN_SAMPLES = 10
+LATENCY_TIMEOUT_FACTOR = 3.0
+TIMEOUT_FLOOR = 5
+TIMEOUT_CEILING = 60
+
+# Path segments that identify an object (VIN, request or trip ids, ...)
+_ID_SEGMENT = re.compile(r"^(\d+|(?=[^/]*\d)[\w.-]{8,})$")
+
+# Status codes that indicate a transient problem on the server side
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+# Status codes that indicate the backend itself is down or overloaded. Other
+# 5xx responses are errors of a single endpoint and do not open the circuit.
+UNAVAILABLE_STATUS = (502, 503, 504)
+
+# API version segment of a path, e.g. v1
+_VERSION_SEGMENT = re.compile(r"^v\d+$")
+
 _LOGGER = logging.getLogger(__name__)
 
 
+class RetryPolicy:
+    """Retry budget and backoff for one class of requests.
+
+    Delays grow exponentially with the attempt number and are jittered, so
+    that several accounts hitting the same outage do not retry in lockstep.
+    A Retry-After header sent with 429/503 takes precedence; if the server
+    asks to wait longer than max_delay, the request is not retried at all.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        retry_status=RETRYABLE_STATUS,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_status = retry_status
+
+    def is_retryable(self, exception) -> bool:
+        if isinstance(exception, ClientResponseError):
+            return exception.status in self.retry_status
+        return isinstance(exception, (TimeoutError, ClientConnectionError))
+
+    def backoff(self, attempt: int) -> float:
+        """Return the jittered delay before retry number attempt (1-based)."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def get_delay(self, attempt: int, exception) -> Optional[float]:
+        """Return the delay before the next attempt or None to give up."""
+        if attempt >= self.max_attempts or not self.is_retryable(exception):
+            return None
+        if isinstance(exception, ClientResponseError) and exception.status in (
+            429,
+            503,
+        ):
+            retry_after = _get_retry_after(exception)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_delay else None
+        return self.backoff(attempt)
+
+
+# Idempotent reads are retried, commands are not, since a command that timed
+# out may well have reached the car. RETRY_LOGIN is the backoff between
+# failed logins, applied to the whole login sequence by AudiConnectAccount.
+RETRY_DEFAULT = RetryPolicy()
+RETRY_NONE = RetryPolicy(max_attempts=1)
+RETRY_LOGIN = RetryPolicy(max_attempts=1, base_delay=60.0, max_delay=3600.0)
+
+
+class CircuitOpenError(TimeoutError):
+    """Raised instead of sending a request to a backend known to be down.
+
+    Derives from TimeoutError, so callers handle it like the timeout they
+    would otherwise have waited for.
+    """
+
+    def __init__(self, backend: str):
+        super().__init__("Backend {} is unavailable".format(backend))
+        self.backend = backend
+
+
+class AuthenticationError(ClientResponseError):
+    """Raised when the backend rejects the access token (HTTP 401)."""
+
+
+# Error classes returned by classify_error
+ERROR_AUTH = "auth"  # token rejected, a token refresh or login may help
+ERROR_TRANSIENT = "transient"  # timeouts, connection errors, 5xx, throttling
+ERROR_UNSUPPORTED = "unsupported"  # endpoint not available for this vehicle
+ERROR_PARSE = "parse"  # response did not have the expected content
+ERROR_OTHER = "other"
+
+
+def classify_error(exception) -> str:
+    """Return the error class of an exception raised while fetching data."""
+    if isinstance(exception, AuthenticationError):
+        return ERROR_AUTH
+    if isinstance(exception, ClientResponseError):
+        if exception.status in (403, 404, 501):
+            return ERROR_UNSUPPORTED
+        if exception.status in RETRYABLE_STATUS or exception.status >= 500:
+            return ERROR_TRANSIENT
+        return ERROR_OTHER
+    if isinstance(exception, (TimeoutError, ClientConnectionError)):
+        return ERROR_TRANSIENT
+    if isinstance(exception, (ValueError, KeyError, TypeError, AttributeError)):
+        return ERROR_PARSE
+    return ERROR_OTHER
+
+
+class CircuitBreaker:
+    """Track the health of one backend, see backend_key.
+
+    After failure_threshold consecutive failed requests (timeouts,
+    connection errors, 502/503/504 after all retries) the circuit opens and
+    requests fail immediately. Once reset_timeout has passed it is
+    half-open: a single probe request is let through, closing the circuit
+    on success and re-opening it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, backend: str, failure_threshold: int = 3, reset_timeout: float = 60.0
+    ):
+        self.backend = backend
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self._probing:
+            return False
+        _LOGGER.debug("Probing backend %s", self.backend)
+        self._probing = True
+        return True
+
+    def record(self, exception: Optional[BaseException]):
+        """Record the outcome of a request that allow() let through."""
+        self._probing = False
+        if exception is None or not self.is_failure(exception):
+            if self.state != self.CLOSED:
+                _LOGGER.info("Backend %s is available again", self.backend)
+            self.state = self.CLOSED
+            self._failures = 0
+            return
+
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state == self.CLOSED:
+                _LOGGER.warning(
+                    "Backend %s is unavailable, skipping requests for %d seconds",
+                    self.backend,
+                    self.reset_timeout,
+                )
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Forget a request that ended without a result (e.g. cancelled)."""
+        self._probing = False
+
+    @staticmethod
+    def is_failure(exception: BaseException) -> bool:
+        if isinstance(exception, ClientResponseError):
+            return exception.status in UNAVAILABLE_STATUS
+        return isinstance(exception, (TimeoutError, ClientConnectionError))
+
+
+class LatencyTracker:
+    """Rolling latency samples and derived timeouts per endpoint template."""
+
+    def __init__(self):
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, endpoint: str, elapsed: float):
+        samples = self._samples.get(endpoint)
+        if samples is None:
+            samples = self._samples[endpoint] = deque(maxlen=LATENCY_SAMPLES)
+        samples.append(elapsed)
+
+    def percentile(self, endpoint: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(endpoint)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def get_timeout(self, endpoint: str) -> float:
+        samples = self._samples.get(endpoint)
+        if samples is None or len(samples) < LATENCY_MIN_SAMPLES:
+            return TIMEOUT
+        p99 = self.percentile(endpoint, 99)
+        return min(TIMEOUT_CEILING, max(TIMEOUT_FLOOR, p99 * LATENCY_TIMEOUT_FACTOR))
+
+
 class AudiAPI:
     HDR_XAPP_VERSION = "4.31.0"
     HDR_USER_AGENT = "Android/4.31.0 (Build 800341641.root project 'myaudi_android'.ext.buildTime) Android/13"
 
-    def __init__(self, session, proxy=None):
-        self.__token = None
+    def __init__(self, session, proxy=None, scheduler=None):
         self.__xclientid = None
         self._session = session
+        self._scheduler = scheduler
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._latency = LatencyTracker()
+        self._token_refresher = None
         if proxy is not None:
             self.__proxy = {"http": proxy, "https": proxy}
         else:
             self.__proxy = None
 
-    def use_token(self, token):
-        self.__token = token
-
     def set_xclient_id(self, xclientid):
         self.__xclientid = xclientid
 
+    def set_token_refresher(self, refresher):
+        """Register the coroutine function that replaces a rejected token.
+
+        refresher(token) is awaited with the token of a request that failed
+        with HTTP 401 and returns the token to replay the request with, or
+        None if the token cannot be refreshed.
+        """
+        self._token_refresher = refresher
+
+    def get_breaker(self, url) -> CircuitBreaker:
+        backend = backend_key(url)
+        breaker = self._breakers.get(backend)
+        if breaker is None:
+            breaker = self._breakers[backend] = CircuitBreaker(backend)
+        return breaker
+
     async def request(
         self,
         method,
         url,
         data,
         headers: Dict[str, str] = None,
+        token: Optional[dict] = None,
         raw_reply: bool = False,
         raw_contents: bool = False,
         rsp_wtxt: bool = False,
+        rsp_wjson: bool = False,
+        rsp_handler: Optional[Callable] = None,
+        retry: Optional[RetryPolicy] = None,
+        **kwargs,
+    ):
+        if retry is None:
+            retry = RETRY_DEFAULT if method == METH_GET else RETRY_NONE
+
+        # The breaker sees the outcome of the request after all retries, so
+        # a single slow request never opens the circuit by itself
+        breaker = self.get_breaker(url)
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.backend)
+        try:
+            result = await self._request_with_retry(
+                method,
+                url,
+                data,
+                retry,
+                headers=headers,
+                token=token,
+                raw_reply=raw_reply,
+                raw_contents=raw_contents,
+                rsp_wtxt=rsp_wtxt,
+                rsp_wjson=rsp_wjson,
+                rsp_handler=rsp_handler,
+                **kwargs,
+            )
+        except Exception as exception:
+            # Timeouts are also raised for cancelled requests, these must
+            # never count against the backend
+            task = asyncio.current_task()
+            if task is not None and task.cancelling():
+                breaker.release()
+            else:
+                breaker.record(exception)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(None)
+        return result
+
+    async def _request_with_retry(
+        self,
+        method,
+        url,
+        data,
+        retry: RetryPolicy,
+        token: Optional[dict] = None,
         **kwargs,
     ):
+        attempt = 1
+        replayed = False
+        while True:
+            # Each attempt waits for its own slot, backoff delays do not
+            # hold one
+            slot = self._scheduler.slot() if self._scheduler else nullcontext()
+            try:
+                async with slot:
+                    return await self._request_once(
+                        method, url, data, token=token, **kwargs
+                    )
+            except Exception as exception:
+                # Cancelled requests must never be retried
+                task = asyncio.current_task()
+                if task is not None and task.cancelling():
+                    raise
+                if (
+                    isinstance(exception, AuthenticationError)
+                    and token is not None
+                    and self._token_refresher is not None
+                    and not replayed
+                ):
+                    # Replay once with a refreshed token, this does not
+                    # count as a retry
+                    token = await self._refresh_token(token)
+                    if token is None:
+                        raise
+                    replayed = True
+                    _LOGGER.debug(
+                        "Token rejected, replaying with refreshed token: method=%s, url=%s",
+                        method,
+                        url,
+                    )
+                    continue
+                delay = retry.get_delay(attempt, exception)
+                if delay is None:
+                    raise
+                _LOGGER.debug(
+                    "Request failed (%s), retrying in %.1f seconds (attempt %d of %d): method=%s, url=%s",
+                    exception.__class__.__name__,
+                    delay,
+                    attempt + 1,
+                    retry.max_attempts,
+                    method,
+                    url,
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _refresh_token(self, token: dict) -> Optional[dict]:
+        # Requests rejected with the same token join one running refresh in
+        # AudiService, see AudiService._run_refresh
+        try:
+            return await self._token_refresher(token)
+        except CancelledError:
+            raise
+        except Exception as exception:
+            _LOGGER.error("Refresh of rejected token failed: %s", exception)
+            return None
+
+    async def _request_once(
+        self,
+        method,
+        url,
+        data,
+        headers: Dict[str, str] = None,
+        token: Optional[dict] = None,
+        raw_reply: bool = False,
+        raw_contents: bool = False,
+        rsp_wtxt: bool = False,
+        rsp_wjson: bool = False,
+        rsp_handler: Optional[Callable] = None,
+        **kwargs,
+    ):
+        # The token is passed per request instead of being stored on the
+        # instance, so concurrent requests cannot swap each other's credentials
+        if token is not None:
+            headers = dict(headers) if headers is not None else {}
+            headers["Authorization"] = "Bearer " + token.get("access_token")
+
         _LOGGER.debug(
             "Request initiated: method=%s, url=%s, data=%s, headers=%s, kwargs=%s",
             method,
@@ -53,35 +433,27 @@ class AudiAPI:
             headers,
             kwargs,
         )
+        endpoint = endpoint_template(method, url)
+        started = time.monotonic()
         try:
-            async with asyncio.timeout(TIMEOUT):
+            async with asyncio.timeout(self._latency.get_timeout(endpoint)):
                 async with self._session.request(
                     method, url, headers=headers, data=data, **kwargs
                 ) as response:
-                    # _LOGGER.debug("Response received: status=%s, headers=%s", response.status, response.headers)
-                    if raw_reply:
-                        # _LOGGER.debug("Returning raw reply")
-                        return response
-                    if rsp_wtxt:
-                        txt = await response.text()
-                        # _LOGGER.debug("Returning response text; length=%d", len(txt))
-                        return response, txt
-                    elif raw_contents:
-                        contents = await response.read()
-                        # _LOGGER.debug("Returning raw contents; length=%d", len(contents))
-                        return contents
-                    elif response.status in (200, 202, 207):
-                        json_data = await response.json(loads=json_loads)
-                        # _LOGGER.debug("Returning JSON data: %s", json_data)
-                        return json_data
-                    else:
-                        # _LOGGER.error("Unexpected response: status=%s, reason=%s", response.status, response.reason)
-                        raise ClientResponseError(
-                            response.request_info,
-                            response.history,
-                            status=response.status,
-                            message=response.reason,
+                    try:
+                        return await self._read_response(
+                            response,
+                            raw_reply,
+                            raw_contents,
+                            rsp_wtxt,
+                            rsp_wjson,
+                            rsp_handler,
                         )
+                    finally:
+                        # Requests cut off by the timeout or by cancellation
+                        # only tell that the endpoint took too long
+                        if not asyncio.current_task().cancelling():
+                            self._latency.record(endpoint, time.monotonic() - started)
         except CancelledError:
             # _LOGGER.error("Request cancelled (Timeout error)")
             raise TimeoutError("Timeout error")
@@ -92,26 +464,102 @@ class AudiAPI:
             # _LOGGER.exception("An unexpected error occurred during request")
             raise
 
+    async def _read_response(
+        self, response, raw_reply, raw_contents, rsp_wtxt, rsp_wjson, rsp_handler
+    ):
+        # _LOGGER.debug("Response received: status=%s, headers=%s", response.status, response.headers)
+        if raw_reply:
+            # _LOGGER.debug("Returning raw reply")
+            return response
+        if rsp_wtxt:
+            txt = await response.text()
+            # _LOGGER.debug("Returning response text; length=%d", len(txt))
+            return response, txt
+        elif rsp_wjson:
+            body = await response.read()
+            return response, json_decode(body)
+        elif raw_contents:
+            contents = await response.read()
+            # _LOGGER.debug("Returning raw contents; length=%d", len(contents))
+            return contents
+        elif rsp_handler is not None and response.status in (200, 202, 207):
+            # The handler consumes the body while it is streamed
+            return await rsp_handler(response)
+        elif response.status in (200, 202, 207):
+            body = await response.read()
+            json_data = json_loads(body) if body.strip() else None
+            # _LOGGER.debug("Returning JSON data: %s", json_data)
+            return json_data
+        else:
+            # _LOGGER.error("Unexpected response: status=%s, reason=%s", response.status, response.reason)
+            error = (
+                AuthenticationError if response.status == 401 else ClientResponseError
+            )
+            raise error(
+                response.request_info,
+                response.history,
+                status=response.status,
+                message=response.reason,
+                headers=response.headers,
+            )
+
     async def get(
-        self, url, raw_reply: bool = False, raw_contents: bool = False, **kwargs
+        self,
+        url,
+        token: Optional[dict] = None,
+        raw_reply: bool = False,
+        raw_contents: bool = False,
+        **kwargs,
     ):
         full_headers = self.__get_headers()
-        r = await self.request(
-            METH_GET,
-            url,
-            data=None,
-            headers=full_headers,
-            raw_reply=raw_reply,
-            raw_contents=raw_contents,
-            **kwargs,
+        if raw_reply or raw_contents:
+            return await self.request(
+                METH_GET,
+                url,
+                data=None,
+                headers=full_headers,
+                token=token,
+                raw_reply=raw_reply,
+                raw_contents=raw_contents,
+                **kwargs,
+            )
+
+        # Identical JSON GETs that are in flight at the same time share one
+        # round trip and one decoded result, which callers must not modify
+        key = (
+            str(url),
+            repr(sorted(kwargs.items())),
+            token.get("access_token") if token is not None else None,
+            self.__xclientid,
+        )
+        if key in self._inflight:
+            _LOGGER.debug("Joining in-flight request: url=%s", url)
+        return await join_flight(
+            self._inflight,
+            key,
+            lambda: self.request(
+                METH_GET,
+                url,
+                data=None,
+                headers=full_headers,
+                token=token,
+                **kwargs,
+            ),
         )
-        return r
 
-    async def put(self, url, data=None, headers: Dict[str, str] = None):
+    async def put(
+        self,
+        url,
+        data=None,
+        headers: Dict[str, str] = None,
+        token: Optional[dict] = None,
+    ):
         full_headers = self.__get_headers()
         if headers is not None:
             full_headers.update(headers)
-        r = await self.request(METH_PUT, url, headers=full_headers, data=data)
+        r = await self.request(
+            METH_PUT, url, headers=full_headers, data=data, token=token
+        )
         return r
 
     async def post(
@@ -119,6 +567,7 @@ class AudiAPI:
         url,
         data=None,
         headers: Dict[str, str] = None,
+        token: Optional[dict] = None,
         use_json: bool = True,
         raw_reply: bool = False,
         raw_contents: bool = False,
@@ -134,6 +583,7 @@ class AudiAPI:
             url,
             headers=full_headers,
             data=data,
+            token=token,
             raw_reply=raw_reply,
             raw_contents=raw_contents,
             **kwargs,
@@ -148,23 +598,119 @@ class AudiAPI:
             "X-App-Name": "myAudi",
             "User-Agent": self.HDR_USER_AGENT,
         }
-        if self.__token is not None:
-            data["Authorization"] = "Bearer " + self.__token.get("access_token")
         if self.__xclientid is not None:
             data["X-Client-ID"] = self.__xclientid
 
         return data
 
 
+# Keys whose values are decoded into datetime objects. Values of all other
+# keys are left untouched, which avoids a failing strptime call for nearly
+# every value of a response.
+DATETIME_KEYS = (
+    "carCapturedTimestamp",  # cariad selectivestatus and parkingposition
+    "timestamp",  # tripdata
+    "content",  # legacy fs-car value wrapper, e.g. vehicleParkingClock
+)
+
+
 def obj_parser(obj):
     """Parse datetime."""
-    for key, val in obj.items():
-        try:
-            obj[key] = datetime.strptime(val, "%Y-%m-%dT%H:%M:%S%z")
-        except (TypeError, ValueError):
-            pass
+    for key in DATETIME_KEYS:
+        val = obj.get(key)
+        if isinstance(val, str):
+            try:
+                obj[key] = datetime.strptime(val, "%Y-%m-%dT%H:%M:%S%z")
+            except ValueError:
+                pass
+    return obj
+
+
+def backend_key(url) -> str:
+    """Return host and API of url, e.g. emea.bff.cariad.digital/vehicle/v1.
+
+    The path is cut after its version segment, so unrelated APIs served by
+    the same host (login, vehicle data, legacy fs-car services) get a
+    circuit breaker each.
+    """
+    parts = urlsplit(str(url))
+    segments = []
+    for segment in parts.path.strip("/").split("/"):
+        segments.append(segment)
+        if _VERSION_SEGMENT.match(segment):
+            break
+    else:
+        segments = segments[:1]
+    return "/".join([parts.hostname or ""] + segments).rstrip("/")
+
+
+def endpoint_template(method: str, url) -> str:
+    """Return method, host and path of url with object ids replaced."""
+    parts = urlsplit(str(url))
+    path = "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in parts.path.split("/")
+    )
+    return "{} {}{}".format(method, parts.hostname, path)
+
+
+def _get_retry_after(exception: ClientResponseError) -> Optional[float]:
+    """Return the Retry-After header of an error response in seconds."""
+    value = exception.headers.get("Retry-After") if exception.headers else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _select_json_backend():
+    """Return name, decoder and decode error type of the fastest JSON backend."""
+    if orjson is not None:
+        return "orjson", orjson.loads, orjson.JSONDecodeError
+    if msgspec is not None:
+        return "msgspec", msgspec.json.decode, msgspec.DecodeError
+    return "json", json.loads, ValueError
+
+
+JSON_BACKEND, _backend_loads, _backend_error = _select_json_backend()
+
+
+def _parse_datetimes(obj):
+    """Apply obj_parser to every dict of an already decoded document."""
+    if isinstance(obj, dict):
+        for val in obj.values():
+            if isinstance(val, (dict, list)):
+                _parse_datetimes(val)
+        obj_parser(obj)
+    elif isinstance(obj, list):
+        for val in obj:
+            if isinstance(val, (dict, list)):
+                _parse_datetimes(val)
     return obj
 
 
+def json_decode(s):
+    """Decode JSON from bytes or str without datetime conversion."""
+    try:
+        return _backend_loads(s)
+    except _backend_error:
+        # The fast backends are stricter than the stdlib (e.g. NaN or
+        # integers beyond 64 bit), so let the stdlib have the final say
+        if JSON_BACKEND == "json":
+            raise
+        return json.loads(s)
+
+
 def json_loads(s):
-    return json.loads(s, object_hook=obj_parser)
+    if JSON_BACKEND == "json":
+        return json.loads(s, object_hook=obj_parser)
+    return _parse_datetimes(json_decode(s))
@@ -3,7 +3,7 @@ from datetime import datetime, timezone, timedelta
 import logging
 import asyncio
 import copy
-from typing import List, Optional
+from typing import Dict, List, Optional
 import re
 
 from asyncio import TimeoutError
@@ -12,13 +12,38 @@ from aiohttp import ClientResponseError
 from abc import ABC, abstractmethod
 
 from .audi_services import AudiService
-from .audi_api import AudiAPI
-from .util import log_exception, get_attr, parse_int, parse_float, parse_datetime
+from .audi_api import (
+    AudiAPI,
+    AuthenticationError,
+    ERROR_TRANSIENT,
+    RETRY_LOGIN,
+    classify_error,
+)
+from .scheduler import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_POLLING,
+    PRIORITY_PROBING,
+    RequestScheduler,
+    request_priority,
+    with_priority,
+)
+from .const import DEFAULT_STATUS_SHARDS, DEFAULT_VEHICLE_CONCURRENCY
+from .job_planner import JobPlanner
+from .token_manager import TokenManager
+from .util import (
+    log_exception,
+    get_attr,
+    join_flight,
+    parse_int,
+    parse_float,
+    parse_datetime,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 MAX_RESPONSE_ATTEMPTS = 10
 REQUEST_STATUS_SLEEP = 5
+MAX_CONCURRENT_UPDATES = 4
 
 ACTION_LOCK = "lock"
 ACTION_CLIMATISATION = "climatisation"
@@ -44,9 +69,19 @@ class AudiConnectAccount:
         country: str,
         spin: str,
         api_level: int,
+        max_concurrent_vehicles: int = DEFAULT_VEHICLE_CONCURRENCY,
+        token_store=None,
+        status_shards: int = DEFAULT_STATUS_SHARDS,
+        trip_store=None,
+        max_concurrent_updates: int = MAX_CONCURRENT_UPDATES,
     ) -> None:
-        self._api = AudiAPI(session)
-        self._audi_service = AudiService(self._api, country, spin, api_level)
+        # Shared by all requests of this account, see scheduler.py
+        self._scheduler = RequestScheduler()
+        self._api = AudiAPI(session, scheduler=self._scheduler)
+        self._audi_service = AudiService(
+            self._api, country, spin, api_level, status_shards
+        )
+        self._api.set_token_refresher(self._refresh_rejected_token)
 
         self._username = username
         self._password = password
@@ -54,13 +89,37 @@ class AudiConnectAccount:
         self._support_vehicle_refresh = True
         self._logintime = 0
 
-        self._connect_retries = 3
-        self._connect_delay = 10
+        self._login_retry = RETRY_LOGIN
+        # Running login, see login
+        self._logins: Dict[str, asyncio.Future] = {}
+        self._login_failures = 0
+        self._login_blocked_until = 0
+
+        # Optional storage (async_load/async_save, e.g. a Home Assistant
+        # Store) used to resume the session after a restart
+        self._token_store = token_store
+        self._session_restore_tried = False
+        # Last token returned for replaying rejected requests
+        self._replay_token = None
+        # Optional storage for the known trips, so trip data is synced
+        # incrementally across restarts as well
+        self._trip_store = trip_store
+        self._trips_restore_tried = False
+        self._saved_trips = None
+        self._token_manager = TokenManager(
+            self._audi_service,
+            on_refresh=self._tokens_refreshed,
+            on_expired=self._tokens_expired,
+        )
 
         self._update_listeners = []
 
-        self._vehicles = []
+        # Registry of AudiConnectVehicle instances, keyed by lower case VIN
+        self._vehicles: Dict[str, AudiConnectVehicle] = {}
         self._audi_vehicles = []
+        self._vehicle_semaphore = asyncio.Semaphore(max_concurrent_vehicles)
+        # Bound of the concurrent endpoint requests of each vehicle update
+        self._max_concurrent_updates = max_concurrent_updates
 
         self._observers: List[AudiConnectObserver] = []
 
@@ -71,20 +130,151 @@ class AudiConnectAccount:
         for observer in self._observers:
             await observer.handle_notification(vin, action)
 
+    def start_token_manager(self, create_task=None):
+        """Refresh tokens in the background instead of at the start of update."""
+        self._token_manager.start(create_task)
+
+    async def stop_token_manager(self):
+        await self._token_manager.stop()
+
+    async def _tokens_refreshed(self):
+        self._logintime = time.time()
+        await self._save_session()
+
+    async def _tokens_expired(self):
+        _LOGGER.warning(
+            "TOKEN: Tokens have expired and cannot be refreshed, logging in again"
+        )
+        self._loggedin = False
+
+    async def _refresh_rejected_token(self, token: dict) -> Optional[dict]:
+        # Called by AudiAPI, which replays the rejected request with the
+        # returned token
+        new_token = await self._audi_service.refresh_rejected_token(token)
+        # Requests rejected together all get the same new token, which only
+        # needs to be stored once
+        if new_token is not None and new_token is not self._replay_token:
+            self._replay_token = new_token
+            await self._tokens_refreshed()
+            self._token_manager.reschedule()
+        return new_token
+
     async def login(self):
-        for i in range(self._connect_retries):
-            self._loggedin = await self.try_login(i == self._connect_retries - 1)
-            if self._loggedin is True:
-                self._logintime = time.time()
-                break
+        """Log in, sharing a login in progress with every other caller."""
+        await join_flight(self._logins, self._username, self._login)
 
-            if i < self._connect_retries - 1:
-                _LOGGER.error(
-                    "LOGIN: Login to Audi service failed, trying again in {} seconds".format(
-                        self._connect_delay
-                    )
+    async def _login(self):
+        if await self._resume_session():
+            self._token_manager.reschedule()
+            return
+
+        remaining = self._login_blocked_until - time.time()
+        if remaining > 0:
+            _LOGGER.debug(
+                "LOGIN: Skipping login after {} failed attempt(s), next attempt in {:.0f} seconds".format(
+                    self._login_failures, remaining
                 )
-                await asyncio.sleep(self._connect_delay)
+            )
+            return
+
+        self._loggedin = await self.try_login(True)
+        if self._loggedin is True:
+            self._logintime = time.time()
+            self._login_failures = 0
+            self._login_blocked_until = 0
+            await self._save_session()
+            self._token_manager.reschedule()
+            return
+
+        # Back off exponentially, also across restarts, so a backend outage
+        # or wrong credentials do not cause a login storm
+        self._login_failures += 1
+        delay = self._login_retry.backoff(self._login_failures)
+        self._login_blocked_until = time.time() + delay
+        _LOGGER.error(
+            "LOGIN: Login to Audi service failed, next attempt in {:.0f} seconds".format(
+                delay
+            )
+        )
+        await self._save_session()
+
+    async def _resume_session(self) -> bool:
+        """Resume the stored session with a token refresh instead of a login."""
+        # Only once per start, afterwards the stored tokens are our own
+        if self._token_store is None or self._session_restore_tried:
+            return False
+        self._session_restore_tried = True
+
+        try:
+            data = await self._token_store.async_load()
+        except Exception as exception:
+            log_exception(exception, "LOGIN: Unable to load the stored session")
+            return False
+
+        if not data or data.get("username") != self._username:
+            return False
+
+        backoff = data.get("login_backoff") or {}
+        self._login_failures = backoff.get("failures", 0)
+        self._login_blocked_until = backoff.get("blocked_until", 0)
+
+        if not self._audi_service.restore_session(data):
+            _LOGGER.debug("LOGIN: Stored session is incomplete, logging in")
+            return False
+
+        _LOGGER.debug("LOGIN: Resuming stored session...")
+        if not await self._audi_service.refresh_tokens():
+            _LOGGER.info("LOGIN: Stored session has expired, logging in")
+            return False
+
+        self._loggedin = True
+        self._logintime = time.time()
+        await self._save_session()
+        _LOGGER.debug("LOGIN: Stored session resumed")
+        return True
+
+    async def _save_session(self):
+        if self._token_store is None:
+            return
+
+        data = self._audi_service.export_session()
+        data["username"] = self._username
+        data["login_backoff"] = {
+            "failures": self._login_failures,
+            "blocked_until": self._login_blocked_until,
+        }
+        try:
+            await self._token_store.async_save(data)
+        except Exception as exception:
+            log_exception(exception, "LOGIN: Unable to store the session")
+
+    async def _restore_trips(self):
+        if self._trip_store is None or self._trips_restore_tried:
+            return
+        self._trips_restore_tried = True
+
+        try:
+            data = await self._trip_store.async_load()
+        except Exception as exception:
+            log_exception(exception, "TRIP DATA: Unable to load the stored trips")
+            return
+
+        if data:
+            self._audi_service.restore_trip_indexes(data)
+            self._saved_trips = data
+
+    async def _save_trips(self):
+        if self._trip_store is None:
+            return
+
+        data = self._audi_service.export_trip_indexes()
+        if data == self._saved_trips:
+            return
+        try:
+            await self._trip_store.async_save(data)
+            self._saved_trips = data
+        except Exception as exception:
+            log_exception(exception, "TRIP DATA: Unable to store the trips")
 
     async def try_login(self, logError):
         try:
@@ -97,6 +287,7 @@ class AudiConnectAccount:
                 _LOGGER.error("LOGIN: Login to Audi service failed: " + str(exception))
             return False
 
+    @with_priority(PRIORITY_POLLING)
     async def update(self, vinlist):
         if not self._loggedin:
             await self.login()
@@ -104,24 +295,32 @@ class AudiConnectAccount:
         if not self._loggedin:
             return False
 
-        #
-        elapsed_sec = time.time() - self._logintime
-        if await self._audi_service.refresh_token_if_necessary(elapsed_sec):
-            # Store current timestamp when refresh was performed and successful
-            self._logintime = time.time()
+        # Without the background token manager, refresh inline
+        if not self._token_manager.running:
+            elapsed_sec = time.time() - self._logintime
+            if await self._audi_service.refresh_token_if_necessary(elapsed_sec):
+                # Store current timestamp when refresh was performed and successful
+                self._logintime = time.time()
+                await self._save_session()
 
         """Update the state of all vehicles."""
+        await self._restore_trips()
         try:
-            if len(self._audi_vehicles) > 0:
-                for vehicle in self._audi_vehicles:
-                    await self.add_or_update_vehicle(vehicle, vinlist)
-
-            else:
-                vehicles_response = await self._audi_service.get_vehicle_information()
+            if len(self._audi_vehicles) == 0:
+                with request_priority(PRIORITY_PROBING):
+                    vehicles_response = (
+                        await self._audi_service.get_vehicle_information()
+                    )
                 self._audi_vehicles = vehicles_response.vehicles
-                self._vehicles = []
+                self._vehicles = {}
+
+            # Vehicle updates handle their own errors and report a rejected
+            # token by returning False, see add_or_update_vehicle
+            async with asyncio.TaskGroup() as tg:
                 for vehicle in self._audi_vehicles:
-                    await self.add_or_update_vehicle(vehicle, vinlist)
+                    tg.create_task(self._update_vehicle_bounded(vehicle, vinlist))
+
+            await self._save_trips()
 
             for listener in self._update_listeners:
                 listener()
@@ -131,28 +330,51 @@ class AudiConnectAccount:
 
             return True
 
+        except AuthenticationError:
+            # AudiAPI already refreshed the token and replayed the request
+            self._loggedin = False
+            return False
+
         except OSError as exception:
             # Force a re-login in case of failure/exception
             self._loggedin = False
             _LOGGER.exception(exception)
             return False
 
+    def set_disabled_attributes(self, vin: str, attributes):
+        """Set the attributes of vin whose entities are disabled, see JobPlanner."""
+        vehicle = self._vehicles.get(vin.lower())
+        if vehicle is not None:
+            vehicle.set_disabled_attributes(attributes)
+
+    async def _update_vehicle_bounded(self, vehicle, vinlist):
+        async with self._vehicle_semaphore:
+            await self.add_or_update_vehicle(vehicle, vinlist)
+
     async def add_or_update_vehicle(self, vehicle, vinlist):
         if vehicle.vin is not None:
-            if vinlist is None or vehicle.vin.lower() in vinlist:
-                vupd = [x for x in self._vehicles if x.vin == vehicle.vin.lower()]
-                if len(vupd) > 0:
-                    if await vupd[0].update() is False:
+            vin = vehicle.vin.lower()
+            if vinlist is None or vin in vinlist:
+                # update() only fails if the token was still rejected after
+                # AudiAPI refreshed it, so only then a new login is needed
+                audiVehicle = self._vehicles.get(vin)
+                if audiVehicle is not None:
+                    if await audiVehicle.update() is False:
                         self._loggedin = False
                 else:
                     try:
-                        audiVehicle = AudiConnectVehicle(self._audi_service, vehicle)
+                        audiVehicle = AudiConnectVehicle(
+                            self._audi_service,
+                            vehicle,
+                            max_concurrent_updates=self._max_concurrent_updates,
+                        )
                         if await audiVehicle.update() is False:
                             self._loggedin = False
-                        self._vehicles.append(audiVehicle)
+                        self._vehicles[vin] = audiVehicle
                     except Exception:
                         pass
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def refresh_vehicle_data(self, vin: str):
         redacted_vin = "*" * (len(vin) - 4) + vin[-4:]
         if not self._loggedin:
@@ -228,6 +450,7 @@ class AudiConnectAccount:
             )
             return False
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def set_vehicle_lock(self, vin: str, lock: bool):
         if not self._loggedin:
             await self.login()
@@ -263,6 +486,7 @@ class AudiConnectAccount:
             )
 
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def async_get_climate_settings(self, vin: str) -> Optional[dict]:
         """Pass through to get climate settings from AudiService."""
         if not self._loggedin:
@@ -275,6 +499,7 @@ class AudiConnectAccount:
         _LOGGER.error("Audi Service not available for get_climate_settings")
         return None
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def async_set_climate_settings(self, vin: str, settings_data: dict) -> bool:
         """Pass through to set climate settings via AudiService."""
         if not self._loggedin:
@@ -287,6 +512,7 @@ class AudiConnectAccount:
         return False
 
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def set_vehicle_climatisation(self, vin: str, activate: bool):
         if not self._loggedin:
             await self.login()
@@ -321,6 +547,7 @@ class AudiConnectAccount:
                 ),
             )
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def start_climate_control(
         self,
         vin: str,
@@ -367,6 +594,7 @@ class AudiConnectAccount:
             )
             return False
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def stop_climate_control(
         self,
         vin: str,
@@ -399,6 +627,7 @@ class AudiConnectAccount:
             )
             return False
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def set_battery_charger(self, vin: str, activate: bool, timer: bool):
         if not self._loggedin:
             await self.login()
@@ -437,6 +666,7 @@ class AudiConnectAccount:
                 ),
             )
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def set_vehicle_window_heating(self, vin: str, activate: bool):
         if not self._loggedin:
             await self.login()
@@ -471,6 +701,7 @@ class AudiConnectAccount:
                 ),
             )
 
+    @with_priority(PRIORITY_INTERACTIVE)
     async def set_vehicle_pre_heater(self, vin: str, activate: bool):
         if not self._loggedin:
             await self.login()
@@ -507,14 +738,23 @@ class AudiConnectAccount:
 
 
 class AudiConnectVehicle:
-    def __init__(self, audi_service: AudiService, vehicle) -> None:
+    def __init__(
+        self,
+        audi_service: AudiService,
+        vehicle,
+        max_concurrent_updates: int = MAX_CONCURRENT_UPDATES,
+    ) -> None:
         self._audi_service = audi_service
+        self._update_semaphore = asyncio.Semaphore(max_concurrent_updates)
         self._vehicle = vehicle
         self._vin = vehicle.vin.lower()
         self._vehicle.state = {}
         self._vehicle.fields = {}
         self._logged_errors = set()
-        self._no_error = False
+        self._auth_failed = False
+        # Status report (selectivestatus response) of the current cycle
+        self._status = None
+        self._job_planner = JobPlanner(vehicle.drivetrain)
 
         self.support_status_report = True
         self.support_position = True
@@ -549,55 +789,61 @@ class AudiConnectVehicle:
     def model_family(self):
         return self._vehicle.model_family
 
-    async def call_update(self, func, ntries: int):
-        try:
-            await func()
-        except TimeoutError:
-            if ntries > 1:
-                await asyncio.sleep(2)
-                await self.call_update(func, ntries - 1)
-            else:
-                raise
-
     async def update(self):
-        info = ""
-        try:
-            self._no_error = True
-            info = "statusreport"
-            await self.call_update(self.update_vehicle_statusreport, 3)
-            info = "shortterm"
-            await self.call_update(self.update_vehicle_shortterm, 3)
-            info = "longterm"
-            await self.call_update(self.update_vehicle_longterm, 3)
-            info = "position"
-            await self.call_update(self.update_vehicle_position, 3)
-            info = "climater"
-            await self.call_update(self.update_vehicle_climater, 3)
-            info = "climate_settings"
-            await self.call_update(self.update_vehicle_climate_settings, 3)            
-            # info = "charger"
-            # await self.call_update(self.update_vehicle_charger, 3)
-            info = "preheater"
-            await self.call_update(self.update_vehicle_preheater, 3)
-            # Return True on success, False on error
-            return self._no_error
-        except Exception as exception:
-            log_exception(
-                exception,
-                "Unable to update vehicle data {} of {}".format(
-                    info, self._vehicle.vin
-                ),
-            )
-            # Even on error, return _no_error state which might be False if earlier steps failed
-            return self._no_error
+        self._auth_failed = False
+        self._status = None
+
+        # Endpoints are fetched concurrently. Steps within one chain write
+        # overlapping state keys (climatisationState, remainingClimatisationTime)
+        # and therefore keep their original order.
+        chains = (
+            (
+                ("statusreport", self.update_vehicle_statusreport),
+                ("climater", self.update_vehicle_climater),
+                ("climate_settings", self.update_vehicle_climate_settings),
+            ),
+            (("shortterm", self.update_vehicle_shortterm),),
+            (("longterm", self.update_vehicle_longterm),),
+            (("position", self.update_vehicle_position),),
+            # (("charger", self.update_vehicle_charger),),
+            (("preheater", self.update_vehicle_preheater),),
+        )
+        await asyncio.gather(*(self._run_update_chain(chain) for chain in chains))
+
+        # Return False if the backend rejected the token. Other errors are
+        # logged by the failing endpoint and do not fail the update.
+        return not self._auth_failed
+
+    async def _run_update_chain(self, chain):
+        for info, func in chain:
+            try:
+                async with self._update_semaphore:
+                    await func()
+            except AuthenticationError:
+                # The remaining steps would be rejected as well
+                self._auth_failed = True
+                return
+            except Exception as exception:
+                log_exception(
+                    exception,
+                    "Unable to update vehicle data {} of {}".format(
+                        info, self._vehicle.vin
+                    ),
+                )
 
+    def set_disabled_attributes(self, attributes):
+        """Set the attributes whose entities are disabled, see JobPlanner."""
+        self._job_planner.set_disabled_attributes(attributes)
 
     def log_exception_once(self, exception, message):
-        self._no_error = False
         err = message + ": " + str(exception).rstrip("\n")
         if err not in self._logged_errors:
             self._logged_errors.add(err)
-            _LOGGER.error(err, exc_info=True)
+            if classify_error(exception) == ERROR_TRANSIENT:
+                # Expected to resolve by itself, a traceback does not help
+                _LOGGER.warning(err)
+            else:
+                _LOGGER.error(err, exc_info=True)
 
 
     async def update_vehicle_climate_settings(self):
@@ -605,13 +851,22 @@ class AudiConnectVehicle:
         redacted_vin = "*" * (len(self._vin) - 4) + self._vin[-4:]
         _LOGGER.debug(f"CLIMATE SETTINGS: Starting update for VIN {redacted_vin} from selective status")
 
-        if not hasattr(self._audi_service, 'async_get_climate_settings'):
+        if self._status is None and not hasattr(
+            self._audi_service, "async_get_climate_settings"
+        ):
             _LOGGER.debug(f"CLIMATE SETTINGS: AudiService has no async_get_climate_settings method. Skipping update for VIN {redacted_vin}.")
             return
 
         try:
-            # Call the updated async_get_climate_settings which now uses the selective status URL
-            full_response = await self._audi_service.async_get_climate_settings(self._vin)
+            if self._status is not None:
+                # Already part of the status report's selectivestatus response
+                climatisation = self._status.climatisation
+                full_response = (
+                    {"climatisation": climatisation} if climatisation else {}
+                )
+            else:
+                # Call the updated async_get_climate_settings which now uses the selective status URL
+                full_response = await self._audi_service.async_get_climate_settings(self._vin)
 
             # --- NEW PARSING LOGIC ---
             if full_response and isinstance(full_response, dict) and 'climatisation' in full_response:
@@ -669,6 +924,8 @@ class AudiConnectVehicle:
                  # self._vehicle.state["remainingClimatisationTime"] = None # Optional clear
             # --- END NEW PARSING LOGIC ---
 
+        except AuthenticationError:
+            raise
         except TimeoutError:
             _LOGGER.warning(f"CLIMATE SETTINGS: Timeout getting selective status for VIN {redacted_vin}")
         except Exception as e:
@@ -681,7 +938,13 @@ class AudiConnectVehicle:
             return
 
         try:
-            status = await self._audi_service.get_stored_vehicle_data(self._vehicle.vin)
+            jobs = self._job_planner.jobs()
+            probe_jobs = self._job_planner.probe_jobs()
+            status = await self._audi_service.get_stored_vehicle_data(
+                self._vehicle.vin, jobs, probe_jobs
+            )
+            self._job_planner.record(jobs | probe_jobs, status.jobs)
+            self._status = status
             self._vehicle.fields = {
                 status.data_fields[i].name: status.data_fields[i].value
                 for i in range(len(status.data_fields))
@@ -714,6 +977,8 @@ class AudiConnectVehicle:
 
         except TimeoutError:
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as resp_exception:
             if resp_exception.status in (403, 404):
                 self.support_status_report = False
@@ -810,6 +1075,8 @@ class AudiConnectVehicle:
                 redacted_vin,
             )
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as cre:
             if cre.status in (403, 404):
                 _LOGGER.error(
@@ -911,6 +1178,8 @@ class AudiConnectVehicle:
                 redacted_vin,
             )
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as cre:
             if cre.status in (403, 404):
                 _LOGGER.debug(
@@ -960,6 +1229,8 @@ class AudiConnectVehicle:
 
         except TimeoutError:
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as cre:
             if cre.status in (403, 404, 502):
                 _LOGGER.debug(
@@ -1067,6 +1338,8 @@ class AudiConnectVehicle:
 
         except TimeoutError:
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as cre:
             if cre.status in (403, 404):
                 _LOGGER.debug(
@@ -1145,6 +1418,8 @@ class AudiConnectVehicle:
                 redacted_vin,
             )
             raise
+        except AuthenticationError:
+            raise
         except ClientResponseError as cre:
             if cre.status in (403, 404):
                 _LOGGER.debug(
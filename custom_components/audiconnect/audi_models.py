@@ -48,6 +48,10 @@ class VehicleDataResponse:
     def __init__(self, data):
         self.data_fields = []
         self.states = []
+        # Jobs contained in the response
+        self.jobs = set(data)
+        # Raw climatisation job, also parsed for the climate settings
+        self.climatisation = data.get("climatisation")
 
         self._tryAppendFieldWithTs(
             data, "TOTAL_RANGE", ["fuelStatus", "rangeStatus", "value", "totalRange_km"]
@@ -594,10 +598,12 @@ class Vehicle:
         self.model_year = ""
         self.model_family = ""
         self.title = ""
+        self.drivetrain = None
 
     def parse(self, data):
         self.vin = data.get("vin")
         self.csid = data.get("csid")
+        self.drivetrain = get_attr(data, "vehicle.classification.driveTrain")
         if (
             data.get("vehicle") is not None
             and data.get("vehicle").get("media") is not None
@@ -1,4 +1,5 @@
 import json
+import time
 import uuid
 import base64
 import os
@@ -14,26 +15,40 @@ from .audi_models import (
     VehicleDataResponse,
     VehiclesResponse,
 )
-from .audi_api import AudiAPI
-from .const import DEFAULT_API_LEVEL
-from .util import to_byte_array, get_attr
+from .audi_api import AudiAPI, AuthenticationError, obj_parser
+from .const import DEFAULT_API_LEVEL, DEFAULT_STATUS_SHARDS
+from .discovery_cache import DISCOVERY_CACHE
+from .job_planner import STATUS_JOBS
+from .json_stream import JSON_STREAM_CHUNK_SIZE, iter_json_array
+from .scheduler import PRIORITY_COMMAND_STATUS, PRIORITY_PROBING, with_priority
+from .token_manager import TOKEN_REFRESHES
+from .trip_index import TripIndex
+from .util import to_byte_array, get_attr, join_flight
 
 from hashlib import sha256, sha512
 import hmac
 import asyncio
 
-from urllib.parse import urlparse, parse_qs, urlencode
-
-import requests
-from bs4 import BeautifulSoup
-from requests import RequestException
+from urllib.parse import urlparse, parse_qs, urlencode, urljoin
 
 from typing import Dict
 
+from aiohttp import ClientResponse, ClientResponseError
+
 
 MAX_RESPONSE_ATTEMPTS = 10
+
+# Redirects followed when authorizing with a stored identity provider session
+SSO_MAX_REDIRECTS = 8
 REQUEST_STATUS_SLEEP = 10
 
+# Attribute holding each kind of token (idk, azs, mbb) passed to requests
+TOKEN_ATTRIBUTES = {
+    "idk": "_bearer_token_json",
+    "azs": "audiToken",
+    "mbb": "vwToken",
+}
+
 SUCCEEDED = "succeeded"
 FAILED = "failed"
 REQUEST_SUCCESSFUL = "request_successful"
@@ -42,9 +57,20 @@ REQUEST_FAILED = "request_failed"
 _LOGGER = logging.getLogger(__name__)
 
 
+def split_jobs(jobs, shards: int):
+    """Split jobs into at most shards lists of about equal size."""
+    jobs = sorted(jobs)
+    return [shard for shard in (jobs[i::shards] for i in range(shards)) if shard]
+
+
+def get_authorization_code(location: str) -> Optional[str]:
+    """Return the code of a myaudi:///?code=... redirect."""
+    return parse_qs(urlparse(location).query).get("code", [None])[0]
+
+
 class BrowserLoginResponse:
-    def __init__(self, response: requests.Response, url: str):
-        self.response = response  # type: requests.Response
+    def __init__(self, response: ClientResponse, url: str):
+        self.response = response  # type: ClientResponse
         self.url = url  # type : str
 
     def get_location(self) -> str:
@@ -70,14 +96,24 @@ class BrowserLoginResponse:
 
 
 class AudiService:
-    def __init__(self, api: AudiAPI, country: str, spin: str, api_level: int):
+    def __init__(
+        self,
+        api: AudiAPI,
+        country: str,
+        spin: str,
+        api_level: int,
+        status_shards: int = DEFAULT_STATUS_SHARDS,
+    ):
         self._api = api
+        self._status_shards = max(1, status_shards)
         self._country = country
         self._language = None
         self._type = "Audi"
         self._spin = spin
         self._homeRegion = {}
         self._homeRegionSetter = {}
+        # Running home region lookup per VIN, see _fill_home_region
+        self._home_region_lookups: Dict[str, asyncio.Future] = {}
         self.mbbOAuthBaseURL = None
         self.mbboauthToken = None
         self.xclientId = None
@@ -85,6 +121,18 @@ class AudiService:
         self._bearer_token_json = None
         self._client_id = ""
         self._authorizationServerBaseURLLive = ""
+        self.audiToken = None
+        self.vwToken = None
+        # Time each kind of token (idk, azs, mbb) was obtained
+        self._token_times: Dict[str, float] = {}
+        # Access token each kind of token replaced on its last refresh
+        self._replaced_tokens: Dict[str, str] = {}
+        # Running refresh per token chain (idk, mbb), see _run_refresh
+        self._token_refreshes: Dict[str, asyncio.Future] = {}
+        # Session cookies of the identity provider, per host
+        self._idp_cookies: Dict[str, Dict[str, str]] = {}
+        # Known trips, per "VIN/kind"
+        self._trip_indexes: Dict[str, TripIndex] = {}
         self._api_level = api_level
 
         if self._api_level is None:
@@ -94,22 +142,18 @@ class AudiService:
             self._country = "DE"
 
     def get_hidden_html_input_form_data(self, response, form_data: Dict[str, str]):
-        # Now parse the html body and extract the target url, csrf token and other required parameters
-        html = BeautifulSoup(response, "html.parser")
-        form_inputs = html.find_all("input", attrs={"type": "hidden"})
-        for form_input in form_inputs:
-            name = form_input.get("name")
-            form_data[name] = form_input.get("value")
+        # Now parse the html body and extract the csrf token and other required parameters
+        from .login_form import parse_login_form
+
+        form_data.update(parse_login_form(response).hidden_inputs)
 
         return form_data
 
     def get_post_url(self, response, url):
-        # Now parse the html body and extract the target url, csrf token and other required parameters
-        html = BeautifulSoup(response, "html.parser")
-        form_tag = html.find("form")
+        # Now parse the html body and extract the target url
+        from .login_form import parse_login_form
 
-        # Extract the target url
-        action = form_tag.get("action")
+        action = parse_login_form(response).action
         if action.startswith("http"):
             # Absolute url
             username_post_url = action
@@ -117,7 +161,7 @@ class AudiService:
             # Relative to domain
             username_post_url = BrowserLoginResponse.to_absolute(url, action)
         else:
-            raise RequestException("Unknown form action: " + action)
+            raise Exception("Unknown form action: " + action)
         return username_post_url
 
     async def login(self, user: str, password: str, persist_token: bool = True):
@@ -145,121 +189,128 @@ class AudiService:
         )
 
     async def request_current_vehicle_data(self, vin: str):
-        self._api.use_token(self.vwToken)
         data = await self._api.post(
             "{homeRegion}/fs-car/bs/vsr/v1/{type}/{country}/vehicles/{vin}/requests".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
         return CurrentVehicleDataResponse(data)
 
     async def get_preheater(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "{homeRegion}/fs-car/bs/rs/v1/{type}/{country}/vehicles/{vin}/status".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
 
-    async def get_stored_vehicle_data(self, vin: str):
+    async def get_stored_vehicle_data(
+        self, vin: str, jobs=None, probe_jobs=None
+    ) -> VehicleDataResponse:
+        """Return the selectivestatus of vin for jobs (default: all parsed jobs).
+
+        The jobs are fetched in status_shards concurrent requests. probe_jobs
+        are requested alongside with probing priority, a failure to get them
+        does not fail the status.
+        """
         redacted_vin = "*" * (len(vin) - 4) + vin[-4:]
-        JOBS2QUERY = {
-            "access",
-            "activeVentilation",
-            "auxiliaryHeating",
-            "batteryChargingCare",
-            "batterySupport",
-            "charging",
-            "chargingProfiles",
-            "chargingTimers",
-            "climatisation",
-            "climatisationTimers",
-            "departureProfiles",
-            "departureTimers",
-            "fuelStatus",
-            "honkAndFlash",
-            "hybridCarAuxiliaryHeating",
-            "lvBattery",
-            "measurements",
-            "oilLevel",
-            "readiness",
-            # "userCapabilities",
-            "vehicleHealthInspection",
-            "vehicleHealthWarnings",
-            "vehicleLights",
-        }
-        self._api.use_token(self._bearer_token_json)
-        data = await self._api.get(
+        if jobs is None:
+            jobs = STATUS_JOBS.keys()
+        fetches = [
+            self._get_selective_status(vin, shard)
+            for shard in split_jobs(jobs, self._status_shards)
+        ]
+        if probe_jobs:
+            fetches.append(self._probe_selective_status(vin, probe_jobs))
+
+        data = {}
+        for part in await asyncio.gather(*fetches):
+            data.update(part or {})
+        _LOGGER.debug("Vehicle data returned for VIN: %s: %s", redacted_vin, data)
+        return VehicleDataResponse(data)
+
+    async def _get_selective_status(self, vin: str, jobs):
+        return await self._api.get(
             "https://{region}.bff.cariad.digital/vehicle/v1/vehicles/{vin}/selectivestatus?jobs={jobs}".format(
                 region="emea" if self._country.upper() != "US" else "na",
                 vin=vin.upper(),
-                jobs=",".join(JOBS2QUERY),
-            )
+                jobs=",".join(sorted(jobs)),
+            ),
+            token=self._bearer_token_json,
         )
-        _LOGGER.debug("Vehicle data returned for VIN: %s: %s", redacted_vin, data)
-        return VehicleDataResponse(data)
+
+    @with_priority(PRIORITY_PROBING)
+    async def _probe_selective_status(self, vin: str, jobs):
+        try:
+            return await self._get_selective_status(vin, jobs)
+        except Exception as exception:
+            _LOGGER.debug(
+                "Probing jobs %s failed: %s", ",".join(sorted(jobs)), exception
+            )
+            return None
 
     async def get_charger(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "{homeRegion}/fs-car/bs/batterycharge/v1/{type}/{country}/vehicles/{vin}/charger".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
 
     async def get_climater(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "{homeRegion}/fs-car/bs/climatisation/v1/{type}/{country}/vehicles/{vin}/climater".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
 
     async def get_stored_position(self, vin: str):
-        self._api.use_token(self._bearer_token_json)
         return await self._api.get(
             "https://{region}.bff.cariad.digital/vehicle/v1/vehicles/{vin}/parkingposition".format(
                 region="emea" if self._country.upper() != "US" else "na",
                 vin=vin.upper(),
-            )
+            ),
+            token=self._bearer_token_json,
         )
 
     async def get_operations_list(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "https://mal-1a.prd.ece.vwg-connect.com/api/rolesrights/operationlist/v3/vehicles/"
-            + vin.upper()
+            + vin.upper(),
+            token=self.vwToken,
         )
 
     async def get_timer(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "{homeRegion}/fs-car/bs/departuretimer/v1/{type}/{country}/vehicles/{vin}/timer".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
 
     async def get_vehicles(self):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "https://msg.volkswagen.de/fs-car/usermanagement/users/v1/{type}/{country}/vehicles".format(
                 type=self._type, country=self._country
-            )
+            ),
+            token=self.vwToken,
         )
 
     async def get_vehicle_information(self):
@@ -273,23 +324,22 @@ class AudiService:
             ),
             "X-User-Country": self._country.upper(),
             "User-Agent": AudiAPI.HDR_USER_AGENT,
-            "Authorization": "Bearer " + self.audiToken["access_token"],
             "Content-Type": "application/json; charset=utf-8",
         }
         req_data = {
             "query": "query vehicleList {\n userVehicles {\n vin\n mappingVin\n vehicle { core { modelYear\n }\n media { shortName\n longName }\n }\n csid\n commissionNumber\n type\n devicePlatform\n mbbConnect\n userRole {\n role\n }\n vehicle {\n classification {\n driveTrain\n }\n }\n nickname\n }\n}"
         }
-        req_rsp, rep_rsptxt = await self._api.request(
+        req_rsp, vins = await self._api.request(
             "POST",
             "https://app-api.my.aoa.audi.com/vgql/v1/graphql"
             if self._country.upper() == "US"
             else "https://app-api.live-my.audi.com/vgql/v1/graphql",  # Starting in 2023, US users need to point at the aoa (Audi of America) URL.
             json.dumps(req_data),
             headers=headers,
+            token=self.audiToken,
             allow_redirects=False,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
-        vins = json.loads(rep_rsptxt)
         if "data" not in vins:
             raise Exception("Invalid json in get_vehicle_information")
 
@@ -298,19 +348,17 @@ class AudiService:
         return response
 
     async def get_vehicle_data(self, vin: str):
-        self._api.use_token(self.vwToken)
         return await self._api.get(
             "{homeRegion}/fs-car/vehicleMgmt/vehicledata/v2/{type}/{country}/vehicles/{vin}/".format(
                 homeRegion=await self._get_home_region(vin.upper()),
                 type=self._type,
                 country=self._country,
                 vin=vin.upper(),
-            )
+            ),
+            token=self.vwToken,
         )
 
     async def get_tripdata(self, vin: str, kind: str):
-        self._api.use_token(self.vwToken)
-
         # read tripdata
         headers = {
             "Accept": "application/json",
@@ -319,59 +367,77 @@ class AudiService:
             "X-App-Version": AudiAPI.HDR_XAPP_VERSION,
             "X-Client-ID": self.xclientId,
             "User-Agent": AudiAPI.HDR_USER_AGENT,
-            "Authorization": "Bearer " + self.vwToken["access_token"],
         }
+        # Only trips newer than the known ones are requested
+        index = self._trip_indexes.setdefault(
+            "{}/{}".format(vin.upper(), kind), TripIndex()
+        )
         td_reqdata = {
             "type": "list",
-            "from": "1970-01-01T00:00:00Z",
-            # "from":(datetime.utcnow() - timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from": index.sync_from,
             "to": (datetime.utcnow() + timedelta(minutes=90)).strftime(
                 "%Y-%m-%dT%H:%M:%SZ"
             ),
         }
-        data = await self._api.request(
-            "GET",
-            "{homeRegion}/api/bs/tripstatistics/v1/vehicles/{vin}/tripdata/{kind}".format(
-                homeRegion=await self._get_home_region_setter(vin.upper()),
-                vin=vin.upper(),
-                kind=kind,
-            ),
-            None,
-            params=td_reqdata,
-            headers=headers,
-        )
-        td_sorted = sorted(
-            data["tripDataList"]["tripData"],
-            key=lambda k: k["overallMileage"],
-            reverse=True,
-        )
-        # _LOGGER.debug("get_tripdata: td_sorted: %s", td_sorted)
-        td_current = td_sorted[0]
-        # FIX, TR/2023-03-25: Assign just in case td_sorted contains only one item
-        td_reset_trip = td_sorted[0]
-
-        for trip in td_sorted:
-            if (td_current["startMileage"] - trip["startMileage"]) > 2:
-                td_reset_trip = trip
-                break
-            else:
-                td_current["tripID"] = trip["tripID"]
-                td_current["startMileage"] = trip["startMileage"]
+
+        async def merge_streamed(response):
+            # The trips are merged while the response is read, so a long
+            # history never has to be held in memory at once
+            cursor = index.cursor
+            try:
+                async for trip in iter_json_array(
+                    response.content.iter_chunked(JSON_STREAM_CHUNK_SIZE),
+                    "tripData",
+                    object_hook=obj_parser,
+                ):
+                    index.merge((trip,))
+            except BaseException:
+                # Trips missing from a broken response are requested again
+                index.cursor = cursor
+                raise
+
+        try:
+            await self._api.request(
+                "GET",
+                "{homeRegion}/api/bs/tripstatistics/v1/vehicles/{vin}/tripdata/{kind}".format(
+                    homeRegion=await self._get_home_region_setter(vin.upper()),
+                    vin=vin.upper(),
+                    kind=kind,
+                ),
+                None,
+                params=td_reqdata,
+                headers=headers,
+                token=self.vwToken,
+                rsp_handler=merge_streamed,
+            )
+        except ClientResponseError as cre:
+            # No trips in the requested period, the known ones are current
+            if cre.status != 204 or len(index) == 0:
+                raise
+
+        td_current, td_reset_trip = index.current_and_reset()
         _LOGGER.debug("TRIP DATA: td_current: %s", td_current)
         _LOGGER.debug("TRIP DATA: td_reset_trip: %s", td_reset_trip)
 
         return TripDataResponse(td_current), TripDataResponse(td_reset_trip)
 
     async def _fill_home_region(self, vin: str):
-        self._homeRegion[vin] = "https://msg.volkswagen.de"
-        self._homeRegionSetter[vin] = "https://mal-1a.prd.ece.vwg-connect.com"
+        # Concurrent update chains of a vehicle share one lookup, so none of
+        # them reads the region before it is known
+        await join_flight(
+            self._home_region_lookups, vin, lambda: self._lookup_home_region(vin)
+        )
+
+    async def _lookup_home_region(self, vin: str):
+        home_region = "https://msg.volkswagen.de"
+        home_region_setter = "https://mal-1a.prd.ece.vwg-connect.com"
 
         try:
-            self._api.use_token(self.vwToken)
             res = await self._api.get(
                 "https://mal-1a.prd.ece.vwg-connect.com/api/cs/vds/v1/vehicles/{vin}/homeRegion".format(
                     vin=vin
-                )
+                ),
+                token=self.vwToken,
             )
             if (
                 res is not None
@@ -381,13 +447,16 @@ class AudiService:
             ):
                 uri = res["homeRegion"]["baseUri"]["content"]
                 if uri != "https://mal-1a.prd.ece.vwg-connect.com/api":
-                    self._homeRegionSetter[vin] = uri.split("/api")[0]
-                    self._homeRegion[vin] = self._homeRegionSetter[vin].replace(
-                        "mal-", "fal-"
-                    )
+                    home_region_setter = uri.split("/api")[0]
+                    home_region = home_region_setter.replace("mal-", "fal-")
         except Exception:
             pass
 
+        # Both are set together once the lookup is done, the defaults only
+        # if it did not return a region
+        self._homeRegion[vin] = home_region
+        self._homeRegionSetter[vin] = home_region_setter
+
     async def _get_home_region(self, vin: str):
         if self._homeRegion.get(vin) is not None:
             return self._homeRegion[vin]
@@ -418,19 +487,14 @@ class AudiService:
         region = "emea" if self._country.upper() != "US" else "na"
         url = f"https://{region}.bff.cariad.digital/vehicle/v1/vehicles/{vin.upper()}/selectivestatus?jobs=climatisation"
 
-        headers = {
-            "Authorization": "Bearer " + self._bearer_token_json["access_token"]
-        }
         try:
-            _LOGGER.debug(f"Sending GET to {url} with headers {headers}")
-            response_data = await self._api.request(
-                "GET",
-                url,
-                headers=headers,
-                data=None,
-            )
+            _LOGGER.debug(f"Sending GET to {url}")
+            response_data = await self._api.get(url, token=self._bearer_token_json)
             _LOGGER.debug(f"GET climate settings response for VIN {redacted_vin}: {response_data}")
             return response_data
+        except AuthenticationError:
+            # The session expired, the caller has to log in again
+            raise
         except Exception as e:
             _LOGGER.error(f"Error getting climate settings for VIN {redacted_vin}: {e}")
             return None
@@ -447,18 +511,15 @@ class AudiService:
         region = "emea" if self._country.upper() != "US" else "na"
         url = f"https://{region}.bff.cariad.digital/vehicle/v1/vehicles/{vin.upper()}/climatisation/settings"
 
-        headers = {
-            "Authorization": "Bearer " + self._bearer_token_json["access_token"]
-        }
         try:
             json_data = json.dumps(settings_data)
-            _LOGGER.debug(f"Sending PUT to {url} with headers {headers} and data {json_data}")
+            _LOGGER.debug(f"Sending PUT to {url} with data {json_data}")
             
             res = await self._api.request(
                  "PUT",
                  url,
                  data=json_data,
-                 headers=headers,
+                 token=self._bearer_token_json,
             )
 
             await self.check_pending_request_succeeded(
@@ -482,7 +543,6 @@ class AudiService:
             "X-App-Version": "3.14.0",
             "X-App-Name": "myAudi",
             "Accept": "application/json",
-            "Authorization": "Bearer " + self.vwToken.get("access_token"),
         }
 
         body = await self._api.request(
@@ -496,6 +556,7 @@ class AudiService:
             + "/security-pin-auth-requested",
             headers=headers,
             data=None,
+            token=self.vwToken,
         )
         secToken = body["securityPinAuthInfo"]["securityToken"]
         challenge = body["securityPinAuthInfo"]["securityPinTransmission"]["challenge"]
@@ -518,7 +579,6 @@ class AudiService:
             "X-App-Version": "3.14.0",
             "X-App-Name": "myAudi",
             "Accept": "application/json",
-            "Authorization": "Bearer " + self.vwToken.get("access_token"),
         }
 
         body = await self._api.request(
@@ -528,6 +588,7 @@ class AudiService:
             ),
             headers=headers,
             data=json.dumps(data),
+            token=self.vwToken,
         )
         return body["securityToken"]
 
@@ -546,7 +607,6 @@ class AudiService:
             "Host": host,
             "X-App-Version": AudiAPI.HDR_XAPP_VERSION,
             "X-App-Name": "myAudi",
-            "Authorization": "Bearer " + self.vwToken.get("access_token"),
             "Accept-charset": "UTF-8",
             "Content-Type": content_type,
             "Accept": "application/json, application/vnd.vwg.mbb.ChargerAction_v1_0_0+xml,application/vnd.volkswagenag.com-error-v1+xml,application/vnd.vwg.mbb.genericError_v1_0_2+xml, application/vnd.vwg.mbb.RemoteStandheizung_v2_0_0+xml, application/vnd.vwg.mbb.genericError_v1_0_2+xml,application/vnd.vwg.mbb.RemoteLockUnlock_v1_0_0+xml,*/*",
@@ -578,6 +638,7 @@ class AudiService:
             ),
             headers=headers,
             data=data,
+            token=self.vwToken,
         )
 
         checkUrl = "https://mal-3a.prd.eu.dp.vwg-connect.com/api/bs/rlu/v1/vehicles/{vin}/requests/{requestId}/status".format(
@@ -612,6 +673,7 @@ class AudiService:
             ),
             headers=headers,
             data=data,
+            token=self.vwToken,
         )
 
         checkUrl = "{homeRegion}/fs-car/bs/batterycharge/v1/{type}/{country}/vehicles/{vin}/charger/actions/{actionid}".format(
@@ -648,6 +710,7 @@ class AudiService:
                     f"https://mal-3a.prd.eu.dp.vwg-connect.com/api/bs/climatisation/v1/vehicles/{vin.upper()}/climater/actions",
                     headers=headers,
                     data=data,
+                    token=self.vwToken,
                 )
                 checkUrl = "https://mal-3a.prd.eu.dp.vwg-connect.com/api/bs/climatisation/v1/vehicles/{vin}/climater/actions/{actionid}".format(
                     vin=vin.upper(),
@@ -664,16 +727,13 @@ class AudiService:
 
             elif api_level == 1:
                 data = None
-                headers = {
-                    "Authorization": "Bearer " + self._bearer_token_json["access_token"]
-                }
                 res = await self._api.request(
                     "POST",
                     "https://emea.bff.cariad.digital/vehicle/v1/vehicles/{vin}/climatisation/stop".format(
                         vin=vin.upper(),
                     ),
-                    headers=headers,
                     data=data,
+                    token=self._bearer_token_json,
                 )
 
                 # checkUrl = "https://emea.bff.cariad.digital/vehicle/v1/vehicles/{vin}/pendingrequests".format(
@@ -770,16 +830,13 @@ class AudiService:
             # old headers
             # headers = self._get_vehicle_action_header("application/json", None)
             # new headers for EU
-            headers = {
-                "Authorization": "Bearer " + self._bearer_token_json["access_token"]
-            }
             res = await self._api.request(
                 "POST",
                 "https://emea.bff.cariad.digital/vehicle/v1/vehicles/{vin}/climatisation/start".format(
                     vin=vin.upper(),
                 ),
-                headers=headers,
                 data=data,
+                token=self._bearer_token_json,
             )
 
             # checkUrl = "https://emea.bff.cariad.digital/vehicle/v1/vehicles/{vin}/pendingrequests".format(
@@ -804,6 +861,7 @@ class AudiService:
                 ),
                 headers=headers,
                 data=data,
+                token=self.vwToken,
             )
 
             checkUrl = "https://mal-3a.prd.eu.dp.vwg-connect.com/api/bs/climatisation/v1/vehicles/{vin}/climater/actions/{actionid}".format(
@@ -830,6 +888,7 @@ class AudiService:
                 ),
                 headers=headers,
                 data=data,
+                token=self.vwToken,
             )
 
             checkUrl = "{homeRegion}/fs-car/bs/climatisation/v1/{type}/{country}/vehicles/{vin}/climater/actions/{actionid}".format(
@@ -857,6 +916,7 @@ class AudiService:
         # are initialized correctly in your class instance.
         country = self._country
         headers = {}
+        token = self.vwToken
         url = None
         # Stop action likely requires an empty JSON body or a specific action type
         data = json.dumps({}) # Default to empty JSON object for POST
@@ -868,8 +928,8 @@ class AudiService:
                     vin=vin.upper()
                 )
                 # Use specific bearer token header for DE
+                token = self._bearer_token_json
                 headers = {
-                    "Authorization": "Bearer " + self._bearer_token_json["access_token"],
                     "Content-Type": "application/json", # Often needed even for empty body
                     "Accept": "application/json", # Good practice to include Accept
                 }
@@ -918,6 +978,7 @@ class AudiService:
                 url,
                 headers=headers,
                 data=data, # Send the JSON data (empty or specific action)
+                token=token,
             )
             _LOGGER.debug(f"Stop climate response: {res}") # Log the response for debugging
 
@@ -954,6 +1015,7 @@ class AudiService:
             ),
             headers=headers,
             data=data,
+            token=self.vwToken,
         )
 
         checkUrl = "{homeRegion}/fs-car/bs/climatisation/v1/{type}/{country}/vehicles/{vin}/climater/actions/{actionid}".format(
@@ -996,16 +1058,17 @@ class AudiService:
             ),
             headers=headers,
             data=data,
+            token=self.vwToken,
         )
 
+    @with_priority(PRIORITY_COMMAND_STATUS)
     async def check_request_succeeded(
         self, url: str, action: str, successCode: str, failedCode: str, path: str
     ):
         for _ in range(MAX_RESPONSE_ATTEMPTS):
             await asyncio.sleep(REQUEST_STATUS_SLEEP)
 
-            self._api.use_token(self.vwToken)
-            res = await self._api.get(url)
+            res = await self._api.get(url, token=self.vwToken)
 
             status = get_attr(res, path)
 
@@ -1021,6 +1084,7 @@ class AudiService:
 
         raise Exception("Cannot {action}, operation timed out".format(action=action))
 
+    @with_priority(PRIORITY_COMMAND_STATUS)
     async def check_pending_request_succeeded(
         self, url: str, request_id: str, action: str,
     ) -> bool:
@@ -1042,10 +1106,6 @@ class AudiService:
         """
         _LOGGER.debug(f"Polling endpoint {url} for request ID {request_id} (Action: {action})")
 
-        headers = {
-            "Authorization": "Bearer " + self._bearer_token_json["access_token"]
-        }
-
         for attempt in range(MAX_RESPONSE_ATTEMPTS):
             await asyncio.sleep(REQUEST_STATUS_SLEEP)
             _LOGGER.debug(f"Polling attempt {attempt + 1}/{MAX_RESPONSE_ATTEMPTS} for request {request_id}")
@@ -1055,7 +1115,7 @@ class AudiService:
                     "GET",
                     url,
                     data=None,
-                    headers=headers,
+                    token=self._bearer_token_json,
                 )
 
                 if res is None or "data" not in res or not isinstance(res.get("data"), list):
@@ -1162,6 +1222,32 @@ class AudiService:
             # refresh not needed now
             return False
 
+        return await self.refresh_tokens()
+
+    # returns True when all tokens were refreshed successfully
+    async def refresh_tokens(self) -> bool:
+        # The exchanges form two independent chains, MBB and IDK -> AZS (the
+        # AZS exchange needs the new IDK access token), which run
+        # concurrently. Each refresh keeps its tokens even if the other fails.
+        results = await asyncio.gather(
+            self.refresh_mbb_token(), self.refresh_idk_token()
+        )
+        return all(results)
+
+    async def _run_refresh(self, chain: str, refresh) -> bool:
+        """Run refresh, or join the refresh of chain that is already running.
+
+        The identity providers may rotate refresh tokens, so two exchanges
+        of the same refresh token must never run at the same time: the one
+        finishing last could invalidate the session.
+        """
+        return await join_flight(self._token_refreshes, chain, refresh)
+
+    # returns True when the MBB token ("vwToken") was refreshed successfully
+    async def refresh_mbb_token(self) -> bool:
+        return await self._run_refresh("mbb", self._refresh_mbb_token)
+
+    async def _refresh_mbb_token(self) -> bool:
         try:
             headers = {
                 "Accept": "application/json",
@@ -1179,22 +1265,38 @@ class AudiService:
             encoded_mbboauth_refresh_data = urlencode(
                 mbboauth_refresh_data, encoding="utf-8"
             ).replace("+", "%20")
-            mbboauth_refresh_rsp, mbboauth_refresh_rsptxt = await self._api.request(
+            mbboauth_refresh_rsp, mbboauth_refresh_rspjson = await self._api.request(
                 "POST",
                 self.mbbOAuthBaseURL + "/mobile/oauth2/v1/token",
                 encoded_mbboauth_refresh_data,
                 headers=headers,
                 allow_redirects=False,
-                rsp_wtxt=True,
+                rsp_wjson=True,
             )
 
             # this code is the old "vwToken"
-            self.vwToken = json.loads(mbboauth_refresh_rsptxt)
+            self._remember_replaced("mbb")
+            self.vwToken = mbboauth_refresh_rspjson
 
             # TR/2022-02-10: If a new refresh_token is provided, save it for further refreshes
             if "refresh_token" in self.vwToken:
                 self.mbboauthToken["refresh_token"] = self.vwToken["refresh_token"]
 
+            self._token_times["mbb"] = time.time()
+
+            return True
+
+        except Exception as exception:
+            _LOGGER.error("Refresh of MBB token failed: " + str(exception))
+            return False
+
+    # returns True when the IDK bearer token and the AZS token derived from
+    # it were refreshed successfully
+    async def refresh_idk_token(self) -> bool:
+        return await self._run_refresh("idk", self._refresh_idk_token)
+
+    async def _refresh_idk_token(self) -> bool:
+        try:
             # hdr
             headers = {
                 "Accept": "application/json",
@@ -1214,15 +1316,17 @@ class AudiService:
             encoded_tokenreq_data = urlencode(tokenreq_data, encoding="utf-8").replace(
                 "+", "%20"
             )
-            bearer_token_rsp, bearer_token_rsptxt = await self._api.request(
+            bearer_token_rsp, bearer_token_rspjson = await self._api.request(
                 "POST",
                 self._tokenEndpoint,
                 encoded_tokenreq_data,
                 headers=headers,
                 allow_redirects=False,
-                rsp_wtxt=True,
+                rsp_wjson=True,
             )
-            self._bearer_token_json = json.loads(bearer_token_rsptxt)
+            self._remember_replaced("idk")
+            self._bearer_token_json = bearer_token_rspjson
+            self._token_times["idk"] = time.time()
 
             # AZS token
             headers = {
@@ -1239,34 +1343,228 @@ class AudiService:
                 "stage": "live",
                 "config": "myaudi",
             }
-            azs_token_rsp, azs_token_rsptxt = await self._api.request(
+            azs_token_rsp, azs_token_json = await self._api.request(
                 "POST",
                 self._authorizationServerBaseURLLive + "/token",
                 json.dumps(asz_req_data),
                 headers=headers,
                 allow_redirects=False,
-                rsp_wtxt=True,
+                rsp_wjson=True,
             )
-            azs_token_json = json.loads(azs_token_rsptxt)
+            self._remember_replaced("azs")
             self.audiToken = azs_token_json
+            self._token_times["azs"] = time.time()
 
             return True
 
         except Exception as exception:
-            _LOGGER.error("Refresh token failed: " + str(exception))
+            _LOGGER.error("Refresh of IDK token failed: " + str(exception))
             return False
 
+    def _remember_replaced(self, kind: str):
+        token = getattr(self, TOKEN_ATTRIBUTES[kind])
+        if token is not None:
+            self._replaced_tokens[kind] = token.get("access_token")
+
+    async def refresh_rejected_token(self, token: dict) -> Optional[dict]:
+        """Refresh token after the backend rejected it.
+
+        Returns the token to replay the request with, or None if token is
+        unknown or could not be refreshed.
+        """
+        access_token = token.get("access_token")
+        for kind, attribute in TOKEN_ATTRIBUTES.items():
+            current = getattr(self, attribute)
+            if current is None:
+                continue
+            if self._replaced_tokens.get(kind) == access_token:
+                # Refreshed since the request was sent
+                return current
+            if current.get("access_token") == access_token:
+                refresh = TOKEN_REFRESHES[kind]
+                _LOGGER.debug("Token (%s) rejected, refreshing...", kind)
+                if not await getattr(self, refresh)():
+                    return None
+                return getattr(self, attribute)
+        return None
+
+    def token_expiry(self, kind: str) -> Optional[float]:
+        """Return when the token of kind (idk, azs, mbb) expires, if known."""
+        token = getattr(self, TOKEN_ATTRIBUTES[kind])
+        obtained_at = self._token_times.get(kind)
+        if token is None or obtained_at is None:
+            return None
+        expires_in = token.get("expires_in")
+        if not isinstance(expires_in, (int, float)):
+            return None
+        return obtained_at + expires_in
+
+    def export_trip_indexes(self) -> dict:
+        """Return the known trips of all vehicles for storage."""
+        return {key: index.to_dict() for key, index in self._trip_indexes.items()}
+
+    def restore_trip_indexes(self, data: dict):
+        """Restore the known trips stored with export_trip_indexes."""
+        for key, index in data.items():
+            self._trip_indexes.setdefault(key, TripIndex.from_dict(index))
+
+    def export_session(self) -> dict:
+        """Return the tokens and endpoint configuration needed to resume."""
+
+        def token_entry(token, kind):
+            if token is None:
+                return None
+            obtained_at = self._token_times.get(kind)
+            expires_in = token.get("expires_in")
+            return {
+                "token": token,
+                "obtained_at": obtained_at,
+                "expires_at": obtained_at + expires_in
+                if obtained_at is not None and isinstance(expires_in, (int, float))
+                else None,
+            }
+
+        return {
+            "country": self._country,
+            "tokens": {
+                "idk": token_entry(self._bearer_token_json, "idk"),
+                "azs": token_entry(self.audiToken, "azs"),
+                "mbboauth": token_entry(self.mbboauthToken, "mbb"),
+                "vw": token_entry(self.vwToken, "mbb"),
+            },
+            "client": {
+                "xclient_id": self.xclientId,
+                "client_id": self._client_id,
+                "language": self._language,
+                "token_endpoint": self._tokenEndpoint,
+                "authorization_server": self._authorizationServerBaseURLLive,
+                "mbb_oauth_base_url": self.mbbOAuthBaseURL,
+            },
+            "idp_cookies": self._idp_cookies,
+        }
+
+    def restore_session(self, data: dict) -> bool:
+        """Restore a session saved by export_session, return False if unusable.
+
+        Only the refresh tokens are relied upon, the caller is expected to
+        refresh the access tokens before using them.
+        """
+        try:
+            if data["country"] != self._country:
+                return False
+            tokens = data["tokens"]
+            client = data["client"]
+            bearer_token = tokens["idk"]["token"]
+            mbboauth_token = tokens["mbboauth"]["token"]
+            if "refresh_token" not in bearer_token:
+                return False
+            if "refresh_token" not in mbboauth_token:
+                return False
+
+            self._bearer_token_json = bearer_token
+            self.mbboauthToken = mbboauth_token
+            self.audiToken = (tokens.get("azs") or {}).get("token")
+            self.vwToken = (tokens.get("vw") or {}).get("token")
+            self.xclientId = client["xclient_id"]
+            self._client_id = client["client_id"]
+            self._language = client["language"]
+            self._tokenEndpoint = client["token_endpoint"]
+            self._authorizationServerBaseURLLive = client["authorization_server"]
+            self.mbbOAuthBaseURL = client["mbb_oauth_base_url"]
+            self._token_times = {
+                kind: (tokens.get(name) or {}).get("obtained_at")
+                for kind, name in (("idk", "idk"), ("azs", "azs"), ("mbb", "vw"))
+            }
+            self._idp_cookies = data.get("idp_cookies") or {}
+        except (KeyError, TypeError):
+            return False
+
+        self._api.set_xclient_id(self.xclientId)
+        return True
+
     # TR/2021-12-01 updated to match behaviour of Android myAudi 4.5.0
     async def login_request(self, user: str, password: str):
-        self._api.use_token(None)
+        try:
+            await self._login_request(user, password)
+        except Exception:
+            # A cached document with an outdated client id or endpoint would
+            # fail every login until it expires, so fetch them again next time
+            await DISCOVERY_CACHE.invalidate(*self._login_config_keys())
+            raise
+
+    def _login_config_keys(self):
+        """Return the DISCOVERY_CACHE keys of the login configuration."""
+        return [
+            "markets",
+            "market:{}:{}".format(self._country.upper(), self._language),
+            "openid:{}".format("na" if self._country.upper() == "US" else "emea"),
+        ]
+
+    async def _login_request(self, user: str, password: str):
         self._api.set_xclient_id(None)
         self.xclientId = None
 
+        authorization_endpoint = await self._fetch_login_config()
+
+        # generate code_challenge
+        code_verifier = str(base64.urlsafe_b64encode(os.urandom(32)), "utf-8").strip(
+            "="
+        )
+        code_challenge = str(
+            base64.urlsafe_b64encode(
+                sha256(code_verifier.encode("ascii", "ignore")).digest()
+            ),
+            "utf-8",
+        ).strip("=")
+        code_challenge_method = "S256"
+
+        #
+        state = str(uuid.uuid4())
+        nonce = str(uuid.uuid4())
+
+        # login page
+        headers = {
+            "Accept": "application/json",
+            "Accept-Charset": "utf-8",
+            "X-App-Version": AudiAPI.HDR_XAPP_VERSION,
+            "X-App-Name": "myAudi",
+            "User-Agent": AudiAPI.HDR_USER_AGENT,
+        }
+        idk_data = {
+            "response_type": "code",
+            "client_id": self._client_id,
+            "redirect_uri": "myaudi:///",
+            "scope": "address profile badge birthdate birthplace nationalIdentifier nationality profession email vin phone nickname name picture mbb gallery openid",
+            "state": state,
+            "nonce": nonce,
+            "prompt": "login",
+            "code_challenge": code_challenge,
+            "code_challenge_method": code_challenge_method,
+            "ui_locales": "de-de de",
+        }
+
+        # With a live identity provider session, authorize redirects straight
+        # back with a code and the login forms can be skipped
+        code = None
+        if self._idp_cookies:
+            code = await self._authorize_sso(authorization_endpoint, idk_data, headers)
+        if code is None:
+            code = await self._authorize_credentials(
+                user, password, authorization_endpoint, idk_data, headers
+            )
+
+        await self._exchange_authorization_code(code, code_verifier)
+
+    async def _fetch_login_config(self) -> str:
+        """Fetch the market and OpenID configuration, return the authorization endpoint."""
         # get markets
-        markets_json = await self._api.request(
-            "GET",
-            "https://content.app.my.audi.com/service/mobileapp/configurations/markets",
-            None,
+        markets_json = await DISCOVERY_CACHE.get(
+            "markets",
+            lambda: self._api.request(
+                "GET",
+                "https://content.app.my.audi.com/service/mobileapp/configurations/markets",
+                None,
+            ),
         )
         if (
             self._country.upper()
@@ -1288,7 +1586,11 @@ class AudiService:
         )
 
         # get market config
-        marketcfg_json = await self._api.request("GET", marketcfg_url, None)
+        _, marketcfg_key, openidcfg_key = self._login_config_keys()
+        marketcfg_json = await DISCOVERY_CACHE.get(
+            marketcfg_key,
+            lambda: self._api.request("GET", marketcfg_url, None),
+        )
 
         # use dynamic config from marketcfg
         self._client_id = "09b6cbec-cd19-4589-82fd-363dfa8c24da@apps_vw-dilab_com"
@@ -1309,7 +1611,10 @@ class AudiService:
             self.mbbOAuthBaseURL = marketcfg_json["mbbOAuthBaseURLLive"]
 
         # get openId config
-        openidcfg_json = await self._api.request("GET", openidcfg_url, None)
+        openidcfg_json = await DISCOVERY_CACHE.get(
+            openidcfg_key,
+            lambda: self._api.request("GET", openidcfg_url, None),
+        )
 
         # use dynamic config from openId config
         authorization_endpoint = "https://identity.vwgroup.io/oidc/v1/authorize"
@@ -1326,42 +1631,54 @@ class AudiService:
         # if "revocation_endpoint" in openidcfg_json:
         # revocation_endpoint = openidcfg_json["revocation_endpoint"]
 
-        # generate code_challenge
-        code_verifier = str(base64.urlsafe_b64encode(os.urandom(32)), "utf-8").strip(
-            "="
-        )
-        code_challenge = str(
-            base64.urlsafe_b64encode(
-                sha256(code_verifier.encode("ascii", "ignore")).digest()
-            ),
-            "utf-8",
-        ).strip("=")
-        code_challenge_method = "S256"
+        return authorization_endpoint
 
-        #
-        state = str(uuid.uuid4())
-        nonce = str(uuid.uuid4())
+    async def _authorize_sso(
+        self, authorization_endpoint: str, idk_data: dict, headers: dict
+    ) -> Optional[str]:
+        """Return an authorization code using the stored identity provider
+        session, or None if the provider asks for credentials."""
+        params = {k: v for k, v in idk_data.items() if k != "prompt"}
+        url = authorization_endpoint
+        try:
+            for _ in range(SSO_MAX_REDIRECTS):
+                rsp = await self._api.request(
+                    "GET",
+                    url,
+                    None,
+                    headers=headers,
+                    params=params,
+                    cookies=self._idp_cookies.get(urlparse(url).hostname),
+                    allow_redirects=False,
+                    raw_reply=True,
+                )
+                self._remember_idp_cookies(rsp)
+                location = rsp.headers.get("Location")
+                if location is None:
+                    # The login form is shown, the session is gone
+                    break
+                if location.startswith("myaudi:///"):
+                    code = get_authorization_code(location)
+                    if code is not None:
+                        _LOGGER.debug("LOGIN: Reused identity provider session")
+                    return code
+                url = urljoin(url, location)
+                params = None
+        except Exception as exception:
+            _LOGGER.debug("LOGIN: Identity provider session not usable: %s", exception)
 
-        # login page
-        headers = {
-            "Accept": "application/json",
-            "Accept-Charset": "utf-8",
-            "X-App-Version": AudiAPI.HDR_XAPP_VERSION,
-            "X-App-Name": "myAudi",
-            "User-Agent": AudiAPI.HDR_USER_AGENT,
-        }
-        idk_data = {
-            "response_type": "code",
-            "client_id": self._client_id,
-            "redirect_uri": "myaudi:///",
-            "scope": "address profile badge birthdate birthplace nationalIdentifier nationality profession email vin phone nickname name picture mbb gallery openid",
-            "state": state,
-            "nonce": nonce,
-            "prompt": "login",
-            "code_challenge": code_challenge,
-            "code_challenge_method": code_challenge_method,
-            "ui_locales": "de-de de",
-        }
+        self._idp_cookies = {}
+        return None
+
+    async def _authorize_credentials(
+        self,
+        user: str,
+        password: str,
+        authorization_endpoint: str,
+        idk_data: dict,
+        headers: dict,
+    ) -> str:
+        """Return an authorization code by submitting the login forms."""
         idk_rsp, idk_rsptxt = await self._api.request(
             "GET",
             authorization_endpoint,
@@ -1370,6 +1687,7 @@ class AudiService:
             params=idk_data,
             rsp_wtxt=True,
         )
+        self._remember_idp_cookies(idk_rsp)
 
         # form_data with email
         submit_data = self.get_hidden_html_input_form_data(idk_rsptxt, {"email": user})
@@ -1384,6 +1702,7 @@ class AudiService:
             allow_redirects=True,
             rsp_wtxt=True,
         )
+        self._remember_idp_cookies(email_rsp)
 
         # form_data with password
         # 2022-01-29: new HTML response uses a js two build the html form data + button.
@@ -1410,6 +1729,7 @@ class AudiService:
             allow_redirects=False,
             rsp_wtxt=True,
         )
+        self._remember_idp_cookies(pw_rsp)
 
         # forward1 after pwd
         fwd1_rsp, fwd1_rsptxt = await self._api.request(
@@ -1421,6 +1741,7 @@ class AudiService:
             allow_redirects=False,
             rsp_wtxt=True,
         )
+        self._remember_idp_cookies(fwd1_rsp)
         # forward2 after pwd
         fwd2_rsp, fwd2_rsptxt = await self._api.request(
             "GET",
@@ -1431,6 +1752,7 @@ class AudiService:
             allow_redirects=False,
             rsp_wtxt=True,
         )
+        self._remember_idp_cookies(fwd2_rsp)
         # get tokens
         codeauth_rsp, codeauth_rsptxt = await self._api.request(
             "GET",
@@ -1441,11 +1763,15 @@ class AudiService:
             allow_redirects=False,
             rsp_wtxt=True,
         )
-        authcode_parsed = urlparse(
-            codeauth_rsp.headers["Location"][len("myaudi:///?") :]
-        )
-        authcode_strings = parse_qs(authcode_parsed.path)
+        self._remember_idp_cookies(codeauth_rsp)
+
+        code = get_authorization_code(codeauth_rsp.headers["Location"])
+        if code is None:
+            raise Exception("No authorization code received")
+        return code
 
+    async def _exchange_authorization_code(self, code: str, code_verifier: str):
+        """Exchange the authorization code for the IDK, AZS and MBB tokens."""
         # hdr
         headers = {
             "Accept": "application/json",
@@ -1458,7 +1784,7 @@ class AudiService:
         tokenreq_data = {
             "client_id": self._client_id,
             "grant_type": "authorization_code",
-            "code": authcode_strings["code"][0],
+            "code": code,
             "redirect_uri": "myaudi:///",
             "response_type": "token id_token",
             "code_verifier": code_verifier,
@@ -1467,15 +1793,15 @@ class AudiService:
         encoded_tokenreq_data = urlencode(tokenreq_data, encoding="utf-8").replace(
             "+", "%20"
         )
-        bearer_token_rsp, bearer_token_rsptxt = await self._api.request(
+        bearer_token_rsp, bearer_token_rspjson = await self._api.request(
             "POST",
             self._tokenEndpoint,
             encoded_tokenreq_data,
             headers=headers,
             allow_redirects=False,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
-        self._bearer_token_json = json.loads(bearer_token_rsptxt)
+        self._bearer_token_json = bearer_token_rspjson
 
         # AZS token
         headers = {
@@ -1492,15 +1818,14 @@ class AudiService:
             "stage": "live",
             "config": "myaudi",
         }
-        azs_token_rsp, azs_token_rsptxt = await self._api.request(
+        azs_token_rsp, azs_token_json = await self._api.request(
             "POST",
             self._authorizationServerBaseURLLive + "/token",
             json.dumps(asz_req_data),
             headers=headers,
             allow_redirects=False,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
-        azs_token_json = json.loads(azs_token_rsptxt)
         self.audiToken = azs_token_json
 
         # mbboauth client register
@@ -1518,15 +1843,14 @@ class AudiService:
             "appVersion": AudiAPI.HDR_XAPP_VERSION,
             "appId": "de.myaudi.mobile.assistant",
         }
-        mbboauth_client_reg_rsp, mbboauth_client_reg_rsptxt = await self._api.request(
+        mbboauth_client_reg_rsp, mbboauth_client_reg_json = await self._api.request(
             "POST",
             self.mbbOAuthBaseURL + "/mobile/register/v1",
             json.dumps(mbboauth_reg_data),
             headers=headers,
             allow_redirects=False,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
-        mbboauth_client_reg_json = json.loads(mbboauth_client_reg_rsptxt)
         self.xclientId = mbboauth_client_reg_json["client_id"]
         self._api.set_xclient_id(self.xclientId)
 
@@ -1546,15 +1870,14 @@ class AudiService:
         encoded_mbboauth_auth_data = urlencode(
             mbboauth_auth_data, encoding="utf-8"
         ).replace("+", "%20")
-        mbboauth_auth_rsp, mbboauth_auth_rsptxt = await self._api.request(
+        mbboauth_auth_rsp, mbboauth_auth_json = await self._api.request(
             "POST",
             self.mbbOAuthBaseURL + "/mobile/oauth2/v1/token",
             encoded_mbboauth_auth_data,
             headers=headers,
             allow_redirects=False,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
-        mbboauth_auth_json = json.loads(mbboauth_auth_rsptxt)
         # store token and expiration time
         self.mbboauthToken = mbboauth_auth_json
 
@@ -1575,17 +1898,28 @@ class AudiService:
         encoded_mbboauth_refresh_data = urlencode(
             mbboauth_refresh_data, encoding="utf-8"
         ).replace("+", "%20")
-        mbboauth_refresh_rsp, mbboauth_refresh_rsptxt = await self._api.request(
+        mbboauth_refresh_rsp, mbboauth_refresh_rspjson = await self._api.request(
             "POST",
             self.mbbOAuthBaseURL + "/mobile/oauth2/v1/token",
             encoded_mbboauth_refresh_data,
             headers=headers,
             allow_redirects=False,
             cookies=mbboauth_client_reg_rsp.cookies,
-            rsp_wtxt=True,
+            rsp_wjson=True,
         )
         # this code is the old "vwToken"
-        self.vwToken = json.loads(mbboauth_refresh_rsptxt)
+        self.vwToken = mbboauth_refresh_rspjson
+        self._token_times = dict.fromkeys(("idk", "azs", "mbb"), time.time())
+
+    def _remember_idp_cookies(self, response):
+        """Keep the identity provider's session cookies per host."""
+        host = response.url.host
+        cookies = self._idp_cookies.setdefault(host, {})
+        for name, morsel in response.cookies.items():
+            if morsel.value:
+                cookies[name] = morsel.value
+            else:
+                cookies.pop(name, None)
 
     def _generate_security_pin_hash(self, challenge):
         pin = to_byte_array(self._spin)
@@ -1601,24 +1935,8 @@ class AudiService:
         page_reply = await self._api.get(login_location, raw_contents=True)
 
         # Now parse the html body and extract the target url, csrf token and other required parameters
-        html = BeautifulSoup(page_reply, "html.parser")
-        form_tag = html.find("form")
-
-        form_inputs = html.find_all("input", attrs={"type": "hidden"})
-        for form_input in form_inputs:
-            name = form_input.get("name")
-            form_data[name] = form_input.get("value")
-
-        # Extract the target url
-        action = form_tag.get("action")
-        if action.startswith("http"):
-            # Absolute url
-            username_post_url = action
-        elif action.startswith("/"):
-            # Relative to domain
-            username_post_url = BrowserLoginResponse.to_absolute(login_location, action)
-        else:
-            raise RequestException("Unknown form action: " + action)
+        form_data = self.get_hidden_html_input_form_data(page_reply, form_data)
+        username_post_url = self.get_post_url(page_reply, login_location)
 
         headers = {"referer": login_location}
         reply = await self._api.post(
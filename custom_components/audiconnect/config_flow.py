@@ -24,6 +24,12 @@ from .const import (
     CONF_API_LEVEL,
     DEFAULT_API_LEVEL,
     API_LEVELS,
+    CONF_STATUS_SHARDS,
+    DEFAULT_STATUS_SHARDS,
+    MAX_STATUS_SHARDS,
+    CONF_VEHICLE_CONCURRENCY,
+    DEFAULT_VEHICLE_CONCURRENCY,
+    MAX_VEHICLE_CONCURRENCY,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -232,6 +238,22 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     vol.Optional(CONF_API_LEVEL, default=current_api_level): vol.All(
                         vol.Coerce(int), vol.In(API_LEVELS)
                     ),
+                    vol.Optional(
+                        CONF_STATUS_SHARDS,
+                        default=self._config_entry.options.get(
+                            CONF_STATUS_SHARDS, DEFAULT_STATUS_SHARDS
+                        ),
+                    ): vol.All(
+                        vol.Coerce(int), vol.Clamp(min=1, max=MAX_STATUS_SHARDS)
+                    ),
+                    vol.Optional(
+                        CONF_VEHICLE_CONCURRENCY,
+                        default=self._config_entry.options.get(
+                            CONF_VEHICLE_CONCURRENCY, DEFAULT_VEHICLE_CONCURRENCY
+                        ),
+                    ): vol.All(
+                        vol.Coerce(int), vol.Clamp(min=1, max=MAX_VEHICLE_CONCURRENCY)
+                    ),
                 }
             ),
         )
@@ -17,8 +17,23 @@ CONF_API_LEVEL = "api_level"
 MIN_UPDATE_INTERVAL = 15
 DEFAULT_UPDATE_INTERVAL = 15
 UPDATE_SLEEP = 5
+
+STORAGE_VERSION = 1
+STORAGE_KEY_SESSION = DOMAIN + ".{}.session"
+STORAGE_KEY_TRIPS = DOMAIN + ".{}.trips"
+STORAGE_KEY_DISCOVERY = DOMAIN + ".discovery"
 DEFAULT_API_LEVEL = 0
 
+# Number of concurrent requests the selectivestatus jobs are split into
+CONF_STATUS_SHARDS = "status_shards"
+DEFAULT_STATUS_SHARDS = 1
+MAX_STATUS_SHARDS = 8
+
+# Number of vehicles of an account that are updated concurrently
+CONF_VEHICLE_CONCURRENCY = "vehicle_concurrency"
+DEFAULT_VEHICLE_CONCURRENCY = 3
+MAX_VEHICLE_CONCURRENCY = 10
+
 CONF_SPIN = "spin"
 CONF_REGION = "region"
 CONF_SERVICE_URL = "service_url"
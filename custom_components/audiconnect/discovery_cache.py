@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from .util import join_flight, start_flight
+
+_LOGGER = logging.getLogger(__name__)
+
+# Age after which a document is revalidated. Stale documents are still
+# served while the revalidation runs in the background.
+DISCOVERY_TTL = 24 * 60 * 60
+
+
+class DiscoveryCache:
+    """Cache for rarely changing discovery documents (markets, market and
+    OpenID configuration), shared by all accounts of the process.
+
+    A store (async_load/async_save, e.g. a Home Assistant Store) can be
+    attached to keep the documents across restarts.
+    """
+
+    def __init__(self, ttl: float = DISCOVERY_TTL):
+        self._ttl = ttl
+        self._entries: Dict[str, dict] = {}
+        # Running fetch per key, see get
+        self._fetches: Dict[str, asyncio.Future] = {}
+        self._store = None
+
+    @property
+    def has_store(self) -> bool:
+        return self._store is not None
+
+    async def attach_store(self, store):
+        """Use store for persistence and load the documents kept in it."""
+        self._store = store
+        try:
+            data = await store.async_load()
+        except Exception as exception:
+            _LOGGER.error("Unable to load the discovery cache: %s", exception)
+            return
+        if data:
+            for key, entry in data.items():
+                self._entries.setdefault(key, entry)
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable]):
+        """Return the document for key, fetching it with fetch if needed.
+
+        The returned document is shared and must not be modified.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return await join_flight(
+                self._fetches, key, lambda: self._fetch(key, fetch)
+            )
+
+        if time.time() - entry["fetched_at"] > self._ttl:
+            # One fetch per key at a time, whether for a miss or a revalidation
+            start_flight(self._fetches, key, lambda: self._fetch(key, fetch))
+        return entry["data"]
+
+    async def invalidate(self, *keys: str):
+        """Drop the documents for keys, so the next get fetches them again."""
+        removed = [key for key in keys if self._entries.pop(key, None) is not None]
+        if removed:
+            _LOGGER.debug("Dropped discovery documents %s", ", ".join(removed))
+            await self._save()
+
+    async def _fetch(self, key: str, fetch):
+        _LOGGER.debug("Fetching discovery document %s", key)
+        try:
+            data = await fetch()
+        except Exception as exception:
+            _LOGGER.debug("Unable to fetch discovery document %s: %s", key, exception)
+            raise
+        self._entries[key] = {"data": data, "fetched_at": time.time()}
+        await self._save()
+        return data
+
+    async def _save(self):
+        if self._store is not None:
+            try:
+                await self._store.async_save(self._entries)
+            except Exception as exception:
+                _LOGGER.error("Unable to store the discovery cache: %s", exception)
+
+
+DISCOVERY_CACHE = DiscoveryCache()
@@ -0,0 +1,156 @@
+import logging
+import time
+from typing import Iterable, Optional, Set
+
+_LOGGER = logging.getLogger(__name__)
+
+# Jobs of the selectivestatus endpoint parsed by VehicleDataResponse and the
+# dashboard attributes whose data they provide
+STATUS_JOBS = {
+    "access": frozenset(
+        (
+            "lock",
+            "doors_trunk_status",
+            "any_window_open",
+            "any_door_unlocked",
+            "any_door_open",
+            "trunk_unlocked",
+            "trunk_open",
+            "hood_open",
+            "left_front_door_open",
+            "right_front_door_open",
+            "left_rear_door_open",
+            "right_rear_door_open",
+            "left_front_window_open",
+            "right_front_window_open",
+            "left_rear_window_open",
+            "right_rear_window_open",
+            "sun_roof",
+            "roof_cover",
+        )
+    ),
+    "charging": frozenset(
+        (
+            "charging_state",
+            "charging_mode",
+            "charging_power",
+            "actual_charge_rate",
+            "state_of_charge",
+            "remaining_charging_time",
+            "charging_complete_time",
+            "target_state_of_charge",
+            "plug_state",
+            "plug_lock_state",
+            "external_power",
+            "plug_led_color",
+        )
+    ),
+    "climatisation": frozenset(
+        (
+            "climatisation_state",
+            "remaining_climatisation_time",
+            "climate_control",
+        )
+    ),
+    "fuelStatus": frozenset(
+        (
+            "range",
+            "car_type",
+            "primary_engine_type",
+            "primary_engine_range",
+            "primary_engine_range_percent",
+            "secondary_engine_type",
+            "secondary_engine_range",
+            "secondary_engine_range_percent",
+            "hybrid_range",
+        )
+    ),
+    "measurements": frozenset(
+        (
+            "mileage",
+            "tank_level",
+            "service_adblue_distance",
+        )
+    ),
+    "oilLevel": frozenset(
+        (
+            "oil_level",
+            "oil_level_binary",
+        )
+    ),
+    "vehicleHealthInspection": frozenset(
+        (
+            "service_inspection_time",
+            "service_inspection_distance",
+            "oil_change_time",
+            "oil_change_distance",
+        )
+    ),
+    "vehicleLights": frozenset(("parking_light",)),
+}
+
+# Jobs a drivetrain (classification.driveTrain of the vehicle list) can
+# never provide
+DRIVETRAIN_EXCLUDED_JOBS = {
+    "ICE": frozenset(("charging",)),
+    "BEV": frozenset(("oilLevel",)),
+}
+
+# Interval in which jobs the vehicle did not return are requested again,
+# e.g. after a software update of the car
+PROBE_INTERVAL = 24 * 60 * 60
+
+
+class JobPlanner:
+    """Plan the selectivestatus jobs of one vehicle.
+
+    A job is polled unless the drivetrain rules it out, the vehicle did not
+    return it, or every entity using its data is disabled in Home Assistant.
+    Entities without a registry entry count as enabled, so a new entity
+    never misses the data it needs to be created.
+    """
+
+    def __init__(self, drivetrain: Optional[str] = None):
+        self._excluded = DRIVETRAIN_EXCLUDED_JOBS.get(
+            (drivetrain or "").upper(), frozenset()
+        )
+        self._unsupported: Set[str] = set()
+        self._disabled_attributes = frozenset()
+        self._probed_at = time.time()
+
+    def set_disabled_attributes(self, attributes: Iterable[str]):
+        self._disabled_attributes = frozenset(attributes)
+
+    def _wanted(self, job: str) -> bool:
+        return job not in self._excluded and not (
+            STATUS_JOBS[job] <= self._disabled_attributes
+        )
+
+    def jobs(self) -> Set[str]:
+        """Return the jobs to poll."""
+        return {
+            job
+            for job in STATUS_JOBS
+            if job not in self._unsupported and self._wanted(job)
+        }
+
+    def probe_jobs(self) -> Set[str]:
+        """Return the unsupported jobs that are due to be requested again."""
+        if time.time() - self._probed_at < PROBE_INTERVAL:
+            return set()
+        self._probed_at = time.time()
+        return {job for job in self._unsupported if self._wanted(job)}
+
+    def record(self, requested: Set[str], returned: Iterable[str]):
+        """Record which of the requested jobs the vehicle returned."""
+        returned = set(returned)
+        if not returned & requested:
+            # An empty or unexpected response says nothing about the jobs
+            return
+        missing = requested - returned
+        if missing - self._unsupported:
+            _LOGGER.debug(
+                "Jobs not returned by the vehicle, no longer polled: %s",
+                ", ".join(sorted(missing - self._unsupported)),
+            )
+        self._unsupported = (self._unsupported | missing) - returned
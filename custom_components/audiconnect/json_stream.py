@@ -0,0 +1,55 @@
+import codecs
+import json
+import re
+from typing import AsyncIterable, AsyncIterator, Callable, Optional
+
+# Responses are read in chunks of this size
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
+_ARRAY_SEPARATOR = re.compile(r"[\s,]*")
+
+
+async def iter_json_array(
+    chunks: AsyncIterable[bytes], key: str, object_hook: Optional[Callable] = None
+) -> AsyncIterator:
+    """Yield the items of the first array named key of a streamed document.
+
+    Only the item being decoded and the unread rest of a chunk are held in
+    memory, however long the array is. Raises ValueError if the document
+    ends before the array does or has no such array.
+    """
+    decoder = json.JSONDecoder(object_hook=object_hook)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    start = re.compile(r'"{}"\s*:\s*\['.format(re.escape(key)))
+    buf = ""
+    in_array = False
+
+    async for chunk in chunks:
+        buf += utf8.decode(chunk)
+        pos = 0
+        if not in_array:
+            match = start.search(buf)
+            if match is None:
+                # Keep enough to find the key split over two chunks
+                buf = buf[-(len(key) + 256) :]
+                continue
+            in_array = True
+            pos = match.end()
+
+        while True:
+            pos = _ARRAY_SEPARATOR.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Incomplete item, continue with the next chunk
+                break
+            yield item
+        buf = buf[pos:]
+
+    if not in_array:
+        raise ValueError("No array {} in the response".format(key))
+    raise ValueError("Incomplete array {} in the response".format(key))
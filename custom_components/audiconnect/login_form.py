@@ -0,0 +1,45 @@
+from html.parser import HTMLParser
+from typing import Dict
+
+# Login pages are parsed in chunks of this size, so parsing can stop soon
+# after the login form
+LOGIN_FORM_CHUNK_SIZE = 4096
+
+
+class LoginFormParser(HTMLParser):
+    """Extract the action and the hidden inputs of the first form of a page.
+
+    Parsing ends with the end of that form, the rest of the page (usually
+    large inline scripts) is never looked at.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.form_found = False
+        self.done = False
+        self.action = None
+        self.hidden_inputs: Dict[str, str] = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "form" and not self.form_found:
+            self.form_found = True
+            self.action = dict(attrs).get("action")
+        elif tag == "input":
+            attrs = dict(attrs)
+            if attrs.get("type") == "hidden":
+                self.hidden_inputs[attrs.get("name")] = attrs.get("value")
+
+    def handle_endtag(self, tag):
+        if tag == "form" and self.form_found:
+            self.done = True
+
+
+def parse_login_form(page) -> LoginFormParser:
+    if isinstance(page, bytes):
+        page = page.decode("utf-8", errors="replace")
+    parser = LoginFormParser()
+    for pos in range(0, len(page), LOGIN_FORM_CHUNK_SIZE):
+        parser.feed(page[pos : pos + LOGIN_FORM_CHUNK_SIZE])
+        if parser.done:
+            break
+    return parser
@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager, contextmanager
+
+_LOGGER = logging.getLogger(__name__)
+
+# Priority classes, lower values are served first
+PRIORITY_INTERACTIVE = 0  # commands triggered by the user
+PRIORITY_COMMAND_STATUS = 1  # polling the result of a command
+PRIORITY_POLLING = 2  # scheduled updates
+PRIORITY_PROBING = 3  # discovering vehicles and their capabilities
+
+MAX_CONCURRENT_REQUESTS = 6
+
+# Slots that only interactive requests may use, so a command never has to
+# wait for a slow background request to finish
+RESERVED_INTERACTIVE_SLOTS = 1
+
+_priority = contextvars.ContextVar(
+    "audiconnect_request_priority", default=PRIORITY_POLLING
+)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run the requests issued within the block with the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def with_priority(priority: int):
+    """Decorate a coroutine function to run its requests with priority."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with request_priority(priority):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class RequestScheduler:
+    """Limit the concurrent requests of an account and grant them by priority.
+
+    Waiting requests are served strictly by priority class and in arrival
+    order within a class, so a user command overtakes any queued background
+    request and only has to wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        reserved_interactive: int = RESERVED_INTERACTIVE_SLOTS,
+    ):
+        self._free = max_concurrent
+        self._reserved = reserved_interactive
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _can_grant(self, priority: int) -> bool:
+        if priority == PRIORITY_INTERACTIVE:
+            return self._free > 0
+        return self._free > self._reserved
+
+    async def acquire(self, priority: int = None):
+        if priority is None:
+            priority = _priority.get()
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._wake_up()
+        if fut.done():
+            return
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # The slot may have been granted right before the cancellation
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._free += 1
+        self._wake_up()
+
+    def _wake_up(self):
+        while self._waiters:
+            priority, _, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_grant(priority):
+                return
+            heapq.heappop(self._waiters)
+            self._free -= 1
+            fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = None):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+# Refresh tokens this long before they expire
+REFRESH_MARGIN = 5 * 60
+
+# Minimum time between two refreshes, so tokens issued with a lifetime
+# shorter than REFRESH_MARGIN are not refreshed in a tight loop
+MIN_REFRESH_INTERVAL = 60
+
+# Wake-up interval while no token expiry is known (e.g. not logged in yet)
+IDLE_INTERVAL = 15 * 60
+
+# Delay after a failed refresh, doubled on every further failure
+RETRY_DELAY = 60
+RETRY_DELAY_MAX = 15 * 60
+
+# Token kinds tracked by AudiService.token_expiry and the refresh that
+# renews them. The AZS token is derived from the IDK token, so both are
+# renewed by the same refresh.
+TOKEN_REFRESHES = {
+    "idk": "refresh_idk_token",
+    "azs": "refresh_idk_token",
+    "mbb": "refresh_mbb_token",
+}
+
+
+class TokenManager:
+    """Refresh the tokens of an AudiService ahead of their expiry.
+
+    Runs as a background task, so polls and commands always find valid
+    tokens and never wait for a refresh themselves.
+    """
+
+    def __init__(
+        self,
+        audi_service,
+        on_refresh: Optional[Callable] = None,
+        on_expired: Optional[Callable] = None,
+    ):
+        self._audi_service = audi_service
+        # Awaited after a successful refresh
+        self._on_refresh = on_refresh
+        # Awaited when a token has expired and could not be refreshed
+        self._on_expired = on_expired
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._failures = 0
+        self._refreshed_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, create_task: Optional[Callable] = None):
+        """Start the refresh loop, in a task of create_task if given."""
+        if not self.running:
+            if create_task is None:
+                create_task = asyncio.get_running_loop().create_task
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def reschedule(self):
+        """Recompute the schedule, e.g. after a login replaced all tokens."""
+        self._failures = 0
+        self._wakeup.set()
+
+    def _next_refresh(self):
+        """Return the refresh method that is due next and when it is due."""
+        due = None
+        for kind, refresh in TOKEN_REFRESHES.items():
+            expires_at = self._audi_service.token_expiry(kind)
+            if expires_at is None:
+                continue
+            refresh_at = expires_at - REFRESH_MARGIN
+            if due is None or refresh_at < due[1]:
+                due = (refresh, refresh_at, expires_at)
+        return due
+
+    async def _run(self):
+        while True:
+            due = self._next_refresh()
+            if due is None:
+                delay = IDLE_INTERVAL
+            elif self._failures:
+                delay = min(RETRY_DELAY_MAX, RETRY_DELAY * 2 ** (self._failures - 1))
+            else:
+                refresh_at = max(due[1], self._refreshed_at + MIN_REFRESH_INTERVAL)
+                delay = refresh_at - time.time()
+
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                    # Woken up early, recompute the schedule
+                    continue
+                except TimeoutError:
+                    pass
+                due = self._next_refresh()
+                if due is None:
+                    continue
+
+            refresh, _, expires_at = due
+            _LOGGER.debug("TOKEN: Refreshing (%s)...", refresh)
+            try:
+                success = await getattr(self._audi_service, refresh)()
+            except Exception as exception:
+                _LOGGER.error("TOKEN: Refresh failed: %s", exception)
+                success = False
+
+            if success:
+                self._failures = 0
+                self._refreshed_at = time.time()
+                if self._on_refresh is not None:
+                    await self._on_refresh()
+                continue
+
+            self._failures += 1
+            if time.time() >= expires_at and self._on_expired is not None:
+                await self._on_expired()
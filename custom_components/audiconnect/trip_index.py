@@ -0,0 +1,125 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+# Start of the history, requested while nothing is known about a vehicle
+TRIPS_EPOCH = "1970-01-01T00:00:00Z"
+
+# Trips are requested from this long before the newest known trip on, so
+# trips reported late or updated by the backend are picked up again
+TRIP_SYNC_OVERLAP = timedelta(days=1)
+
+# Trips whose start mileage differs by at most this many km belong to the
+# same accumulation since the last reset
+RESET_MILEAGE_GAP = 2
+
+# Trips are dropped while merging once the index holds this many, so even
+# the full history of a first sync never has to be held at once
+TRIP_INDEX_PRUNE_SIZE = 256
+
+
+class TripIndex:
+    """Known trips of one vehicle and kind (shortTerm, longTerm).
+
+    Only the trips since the last reset and the reset trip itself are kept,
+    so the index stays small however long the history of the vehicle is.
+    """
+
+    def __init__(self):
+        self._trips: Dict[str, dict] = {}
+        # Timestamp and tripID of the newest known trip
+        self.cursor: Optional[dict] = None
+        self._prune_at = TRIP_INDEX_PRUNE_SIZE
+
+    def __len__(self):
+        return len(self._trips)
+
+    @property
+    def sync_from(self) -> str:
+        """Return the start of the period to request trips for."""
+        if self.cursor is None:
+            return TRIPS_EPOCH
+        timestamp = self.cursor["timestamp"] - TRIP_SYNC_OVERLAP
+        return timestamp.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def merge(self, trips: Iterable[dict]):
+        """Add trips, replacing known trips with the same tripID."""
+        for trip in trips:
+            self._trips[str(trip["tripID"])] = trip
+            timestamp = trip.get("timestamp")
+            if isinstance(timestamp, datetime) and (
+                self.cursor is None or timestamp >= self.cursor["timestamp"]
+            ):
+                self.cursor = {"timestamp": timestamp, "tripID": trip["tripID"]}
+            if len(self._trips) >= self._prune_at:
+                self.current_and_reset()
+                # A long accumulation must not be sorted again for every trip
+                self._prune_at = max(TRIP_INDEX_PRUNE_SIZE, 2 * len(self._trips))
+
+    def current_and_reset(self):
+        """Return the current accumulation and the trip of the last reset.
+
+        Trips before the reset trip are dropped from the index.
+        """
+        trips = sorted(
+            self._trips.values(), key=lambda k: k["overallMileage"], reverse=True
+        )
+        # The current trip spans all trips since the reset, it is a copy so
+        # the stored trips keep their own values
+        td_current = dict(trips[0])
+        # Just in case there is no reset trip
+        td_reset_trip = td_current
+
+        for trip in trips:
+            if (td_current["startMileage"] - trip["startMileage"]) > RESET_MILEAGE_GAP:
+                td_reset_trip = trip
+                break
+            else:
+                td_current["tripID"] = trip["tripID"]
+                td_current["startMileage"] = trip["startMileage"]
+
+        if td_reset_trip is not td_current:
+            self._trips = {
+                key: trip
+                for key, trip in self._trips.items()
+                if trip["overallMileage"] >= td_reset_trip["overallMileage"]
+            }
+        return td_current, td_reset_trip
+
+    def to_dict(self) -> dict:
+        """Return the index as JSON serializable dict."""
+        return {
+            "cursor": _serialize_trip(self.cursor) if self.cursor else None,
+            "trips": [_serialize_trip(trip) for trip in self._trips.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TripIndex":
+        index = cls()
+        index.merge(_deserialize_trip(trip) for trip in data.get("trips") or [])
+        if data.get("cursor"):
+            cursor = _deserialize_trip(data["cursor"])
+            if isinstance(cursor.get("timestamp"), datetime) and (
+                index.cursor is None or cursor["timestamp"] > index.cursor["timestamp"]
+            ):
+                index.cursor = cursor
+        return index
+
+
+def _serialize_trip(trip: dict) -> dict:
+    timestamp = trip.get("timestamp")
+    if isinstance(timestamp, datetime):
+        trip = dict(trip, timestamp=timestamp.isoformat())
+    return trip
+
+
+def _deserialize_trip(trip: dict) -> dict:
+    timestamp = trip.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            trip = dict(trip, timestamp=datetime.fromisoformat(timestamp))
+        except ValueError:
+            _LOGGER.debug("Invalid timestamp of stored trip: %s", timestamp)
+    return trip
@@ -1,5 +1,7 @@
 from functools import reduce
 from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict
+import asyncio
 import logging
 
 _LOGGER = logging.getLogger(__name__)
@@ -55,3 +57,31 @@ def parse_datetime(time_value):
             except ValueError:
                 continue
     return None
+
+
+def start_flight(flights: Dict, key, start: Callable[[], Awaitable]) -> asyncio.Future:
+    """Return the running flight for key, or start one by calling start.
+
+    Callers with the same key share one flight. Its entry in flights is
+    removed once it is done, so a later call starts a new one.
+    """
+    flight = flights.get(key)
+    if flight is None:
+        flight = asyncio.ensure_future(start())
+        flights[key] = flight
+        flight.add_done_callback(lambda f: _end_flight(flights, key, f))
+    return flight
+
+
+async def join_flight(flights: Dict, key, start: Callable[[], Awaitable]):
+    """Await the flight for key, see start_flight."""
+    # A cancelled caller must not cancel the flight for the others
+    return await asyncio.shield(start_flight(flights, key, start))
+
+
+def _end_flight(flights: Dict, key, flight: asyncio.Future):
+    if flights.get(key) is flight:
+        del flights[key]
+    if not flight.cancelled():
+        # Mark the exception as retrieved in case every caller is gone
+        flight.exception()
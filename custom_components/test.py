@@ -48,7 +48,7 @@ async def main(argv):
 
         await account.update(None)
 
-        for vehicle in account._vehicles:
+        for vehicle in account._vehicles.values():
             dashboard = Dashboard(account, vehicle, miles=True)
             for instrument in dashboard.instruments:
                 print(str(instrument), instrument.str_state)
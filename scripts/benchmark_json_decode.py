@@ -0,0 +1,103 @@
+"""Compare the JSON decode paths of AudiAPI on recorded responses.
+
+Decodes the selectivestatus and tripdata fixtures with the stdlib and the
+original object hook, which tried strptime on every value, with the
+stdlib and the current obj_parser, and with orjson and msgspec where they
+are installed. Run from the repository root:
+
+    python scripts/benchmark_json_decode.py --rounds 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+import types
+from datetime import datetime
+from pathlib import Path
+
+# Load the API client without Home Assistant, see tests/conftest.py
+package = types.ModuleType("audiconnect")
+package.__path__ = [
+    str(Path(__file__).parent.parent / "custom_components" / "audiconnect")
+]
+sys.modules["audiconnect"] = package
+
+from audiconnect.audi_api import _parse_datetimes, obj_parser  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "fixtures"
+FIXTURE_NAMES = ("selectivestatus.json", "tripdata.json")
+
+
+def old_obj_parser(obj):
+    """obj_parser before DATETIME_KEYS, tries every value of every dict."""
+    for key, val in obj.items():
+        try:
+            obj[key] = datetime.strptime(val, "%Y-%m-%dT%H:%M:%S%z")
+        except (TypeError, ValueError):
+            pass
+    return obj
+
+
+DECODERS = {
+    "json, old obj_parser": lambda s: json.loads(s, object_hook=old_obj_parser),
+    "json, obj_parser": lambda s: json.loads(s, object_hook=obj_parser),
+}
+if orjson is not None:
+    DECODERS["orjson, obj_parser"] = lambda s: _parse_datetimes(orjson.loads(s))
+if msgspec is not None:
+    DECODERS["msgspec, obj_parser"] = lambda s: _parse_datetimes(msgspec.json.decode(s))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(decode, body, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        decode(body)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def main(args):
+    print("fixture               decoder                  p50     p95  (us)")
+    for name in FIXTURE_NAMES:
+        body = (FIXTURES / name).read_bytes()
+        expected = DECODERS["json, obj_parser"](body)
+        for decoder, decode in DECODERS.items():
+            # Same document (datetimes included) for every decoder, except
+            # the old hook, which also converted e.g. expirationDate
+            if decoder != "json, old obj_parser" and decode(body) != expected:
+                raise SystemExit("{} decodes {} differently".format(decoder, name))
+            timings = measure(decode, body, args.rounds)
+            print(
+                "{:<21} {:<21} {:>7.0f} {:>7.0f}".format(
+                    name,
+                    decoder,
+                    percentile(timings, 50),
+                    percentile(timings, 95),
+                )
+            )
+    for backend, module in (("orjson", orjson), ("msgspec", msgspec)):
+        if module is None:
+            print("{} is not installed, skipped".format(backend))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    main(parser.parse_args())
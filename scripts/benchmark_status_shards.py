@@ -0,0 +1,130 @@
+"""Compare selectivestatus latency of one request and of N concurrent shards.
+
+A local aiohttp server stands in for the backend. It answers after a fixed
+overhead plus a heavy tailed time per job, collecting the jobs of a request
+one after the other. Run from the repository root:
+
+    python scripts/benchmark_status_shards.py --refreshes 300
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import types
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+# Load the API client without Home Assistant, see tests/conftest.py
+package = types.ModuleType("audiconnect")
+package.__path__ = [
+    str(Path(__file__).parent.parent / "custom_components" / "audiconnect")
+]
+sys.modules["audiconnect"] = package
+
+from audiconnect.audi_api import AudiAPI  # noqa: E402
+from audiconnect.audi_services import AudiService  # noqa: E402
+from audiconnect.job_planner import STATUS_JOBS  # noqa: E402
+from audiconnect.scheduler import RequestScheduler  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 8766
+VIN = "WAUZZZ4G7EN012345"
+
+# Stand-in backend: overhead per request, lognormal time per job (median
+# 10 ms)
+REQUEST_OVERHEAD = 0.03
+JOB_TIME_MU = -4.6
+JOB_TIME_SIGMA = 0.8
+
+JOB_SETS = {
+    "23 jobs": ["job{}".format(i) for i in range(23)],
+    "8 jobs": sorted(STATUS_JOBS),
+}
+
+
+class LocalAudiService(AudiService):
+    """AudiService sending its selectivestatus requests to the stand-in."""
+
+    async def _get_selective_status(self, vin: str, jobs):
+        return await self._api.get(
+            "http://{}:{}/vehicle/v1/vehicles/{}/selectivestatus?jobs={}".format(
+                HOST, PORT, vin, ",".join(sorted(jobs))
+            ),
+            token={"access_token": "token"},
+        )
+
+
+def make_app(seed: int) -> web.Application:
+    rnd = random.Random(seed)
+
+    async def selectivestatus(request):
+        jobs = request.query["jobs"].split(",")
+        await asyncio.sleep(
+            REQUEST_OVERHEAD
+            + sum(rnd.lognormvariate(JOB_TIME_MU, JOB_TIME_SIGMA) for _ in jobs)
+        )
+        return web.json_response(
+            {
+                job: {
+                    "status": {
+                        "value": {"carCapturedTimestamp": "2024-04-12T05:56:13Z"}
+                    }
+                }
+                for job in jobs
+            }
+        )
+
+    app = web.Application()
+    app.router.add_get("/vehicle/v1/vehicles/{vin}/selectivestatus", selectivestatus)
+    return app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def measure(session, jobs, shards, refreshes):
+    api = AudiAPI(session, scheduler=RequestScheduler())
+    service = LocalAudiService(api, "DE", None, 1, status_shards=shards)
+    latencies = []
+    for _ in range(refreshes):
+        started = time.perf_counter()
+        await service.get_stored_vehicle_data(VIN, jobs)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def main(args):
+    runner = web.AppRunner(make_app(args.seed))
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            print("jobs      shards     p50     p95     p99  (ms per refresh)")
+            for name, jobs in JOB_SETS.items():
+                for shards in args.shards:
+                    latencies = await measure(session, jobs, shards, args.refreshes)
+                    print(
+                        "{:<9} {:>6} {:>7.0f} {:>7.0f} {:>7.0f}".format(
+                            name,
+                            shards,
+                            percentile(latencies, 50),
+                            percentile(latencies, 95),
+                            percentile(latencies, 99),
+                        )
+                    )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refreshes", type=int, default=300)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,35 @@
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+# The API client modules do not depend on Home Assistant, so they are loaded
+# as a plain package without running the integration's __init__.py
+PACKAGE_PATH = Path(__file__).parent.parent / "custom_components" / "audiconnect"
+FIXTURES_PATH = Path(__file__).parent / "fixtures"
+
+if "audiconnect" not in sys.modules:
+    package = types.ModuleType("audiconnect")
+    package.__path__ = [str(PACKAGE_PATH)]
+    sys.modules["audiconnect"] = package
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES_PATH / name).read_text(encoding="utf-8")
+
+
+@pytest.fixture
+def selectivestatus() -> str:
+    return load_fixture("selectivestatus.json")
+
+
+@pytest.fixture
+def selectivestatus_data(selectivestatus) -> dict:
+    return json.loads(selectivestatus)
+
+
+@pytest.fixture
+def tripdata() -> str:
+    return load_fixture("tripdata.json")
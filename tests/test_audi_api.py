@@ -0,0 +1,199 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from aiohttp import ClientResponseError
+
+from audiconnect import audi_api
+from audiconnect.audi_api import (
+    DATETIME_KEYS,
+    RETRY_DEFAULT,
+    CircuitBreaker,
+    CircuitOpenError,
+    json_loads,
+)
+from audiconnect.audi_models import VehicleDataResponse
+
+
+def _values(obj, key):
+    """Yield every value stored under key anywhere in obj."""
+    if isinstance(obj, dict):
+        for k, val in obj.items():
+            if k == key:
+                yield val
+            yield from _values(val, key)
+    elif isinstance(obj, list):
+        for val in obj:
+            yield from _values(val, key)
+
+
+@pytest.fixture(params=["json", "fast"])
+def json_backend(request, monkeypatch):
+    """Decode with the object_hook path and with the post-decode walk."""
+    monkeypatch.setattr(audi_api, "JSON_BACKEND", request.param)
+    return request.param
+
+
+def test_json_loads_parses_timestamps(json_backend, selectivestatus):
+    data = json_loads(selectivestatus)
+
+    captured = list(_values(data, "carCapturedTimestamp"))
+    assert len(captured) == selectivestatus.count('"carCapturedTimestamp"')
+    assert all(isinstance(val, datetime) for val in captured)
+    assert data["access"]["accessStatus"]["value"]["carCapturedTimestamp"] == datetime(
+        2024, 4, 12, 5, 56, 13, tzinfo=timezone.utc
+    )
+
+
+def test_json_loads_parses_trip_timestamps(json_backend, tripdata):
+    trips = json_loads(tripdata)["tripDataList"]["tripData"]
+
+    assert len(trips) == tripdata.count('"timestamp"')
+    assert all(isinstance(trip["timestamp"], datetime) for trip in trips)
+    assert trips[0]["timestamp"] == datetime(2024, 3, 22, 3, 12, tzinfo=timezone.utc)
+
+
+def test_json_loads_leaves_other_values(json_backend, selectivestatus):
+    data = json_loads(selectivestatus)
+
+    # Timestamps under keys nobody reads as datetime stay strings
+    assert (
+        data["userCapabilities"]["capabilitiesStatus"]["value"][0]["expirationDate"]
+        == "2027-03-31T00:00:00Z"
+    )
+    timer = data["departureTimers"]["departureTimersStatus"]["value"]["timers"][0]
+    assert timer["singleTimer"]["startDateTimeLocal"] == "2024-04-13T07:00:00"
+    assert data["measurements"]["odometerStatus"]["value"]["odometer"] == 24817
+
+
+def test_json_loads_keeps_unparsable_timestamps(json_backend):
+    data = json_loads('{"timestamp": "yesterday", "content": 12}')
+
+    assert data == {"timestamp": "yesterday", "content": 12}
+
+
+def test_datetime_keys_cover_the_timestamps_read_by_the_models():
+    assert "carCapturedTimestamp" in DATETIME_KEYS
+    assert "timestamp" in DATETIME_KEYS
+
+
+def test_vehicle_data_response_states_have_datetimes(json_backend, selectivestatus):
+    response = VehicleDataResponse(json_loads(selectivestatus))
+
+    assert response.states
+    assert response.data_fields
+    assert all(isinstance(state["measure_time"], datetime) for state in response.states)
+    assert all(
+        isinstance(field.measure_time, datetime) for field in response.data_fields
+    )
+
+
+@pytest.mark.parametrize(
+    ("url", "backend"),
+    [
+        (
+            "https://emea.bff.cariad.digital/vehicle/v1/vehicles/WAUZZZ/selectivestatus",
+            "emea.bff.cariad.digital/vehicle/v1",
+        ),
+        (
+            "https://emea.bff.cariad.digital/login/v1/idk/token",
+            "emea.bff.cariad.digital/login/v1",
+        ),
+        (
+            "https://mal-3a.prd.eu.dp.vwg-connect.com/api/bs/rlu/v1/vehicles/WAUZZZ/lock",
+            "mal-3a.prd.eu.dp.vwg-connect.com/api/bs/rlu/v1",
+        ),
+        (
+            "https://identity.audi.com/signin-service",
+            "identity.audi.com/signin-service",
+        ),
+        ("https://identity.audi.com", "identity.audi.com"),
+    ],
+)
+def test_backend_key(url, backend):
+    assert audi_api.backend_key(url) == backend
+
+
+def _api_failing_with(exception):
+    api = audi_api.AudiAPI(session=None)
+    calls = []
+
+    async def request_once(method, url, data, **kwargs):
+        calls.append(url)
+        if "healthy" in url:
+            return {}
+        raise exception
+
+    api._request_once = request_once
+    return api, calls
+
+
+def _server_error(status):
+    return ClientResponseError(None, (), status=status)
+
+
+def test_internal_server_errors_do_not_open_the_circuit():
+    api, calls = _api_failing_with(_server_error(500))
+    url = "https://fal.example/fs-car/bs/climatisation/v1/vehicles/WAUZZZ/climater"
+
+    async def run():
+        for _ in range(5):
+            with pytest.raises(ClientResponseError):
+                await api.get(url)
+
+    asyncio.run(run())
+    assert len(calls) == 5
+    assert api.get_breaker(url).state == CircuitBreaker.CLOSED
+
+
+def test_retries_count_as_one_failure(monkeypatch):
+    monkeypatch.setattr(RETRY_DEFAULT, "backoff", lambda attempt: 0)
+    api, calls = _api_failing_with(asyncio.TimeoutError())
+    url = "https://emea.bff.cariad.digital/vehicle/v1/vehicles/WAUZZZ/parkingposition"
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await api.get(url)
+
+    asyncio.run(run())
+    assert len(calls) == RETRY_DEFAULT.max_attempts
+    assert api.get_breaker(url).state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_only_skips_its_backend(monkeypatch):
+    monkeypatch.setattr(RETRY_DEFAULT, "backoff", lambda attempt: 0)
+    api, calls = _api_failing_with(_server_error(503))
+    down = "https://emea.bff.cariad.digital/vehicle/v1/vehicles/WAUZZZ/parkingposition"
+    healthy = "https://emea.bff.cariad.digital/login/v1/idk/healthy"
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ClientResponseError):
+                await api.get(down)
+        with pytest.raises(CircuitOpenError):
+            await api.get(down)
+        assert await api.get(healthy) == {}
+
+    asyncio.run(run())
+    assert api.get_breaker(down).state == CircuitBreaker.OPEN
+
+
+def test_concurrent_gets_share_one_request():
+    api = audi_api.AudiAPI(session=None)
+    calls = []
+
+    async def request_once(method, url, data, **kwargs):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return {"calls": len(calls)}
+
+    api._request_once = request_once
+    url = "https://emea.bff.cariad.digital/vehicle/v1/vehicles/WAUZZZ/parkingposition"
+
+    async def run():
+        shared = await asyncio.gather(api.get(url), api.get(url), api.get(url))
+        return shared, await api.get(url)
+
+    shared, later = asyncio.run(run())
+    assert shared == [{"calls": 1}] * 3
+    assert later == {"calls": 2}
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError, RequestInfo
+from yarl import URL
+
+from audiconnect.audi_api import AuthenticationError
+from audiconnect.audi_services import AudiService
+
+
+class FailingApi:
+    def __init__(self, exception):
+        self.exception = exception
+
+    async def get(self, url, **kwargs):
+        raise self.exception
+
+
+URL_SELECTIVESTATUS = URL(
+    "https://emea.bff.cariad.digital/vehicle/v1/vehicles/WAUZZZ4G7EN012345/selectivestatus"
+)
+
+
+def _error(error, status):
+    request_info = RequestInfo(URL_SELECTIVESTATUS, "GET", {}, URL_SELECTIVESTATUS)
+    return error(request_info, (), status=status)
+
+
+def _service(exception):
+    service = AudiService(FailingApi(exception), "DE", None, 1)
+    service._bearer_token_json = {"access_token": "token"}
+    return service
+
+
+def test_climate_settings_raise_a_rejected_token():
+    service = _service(_error(AuthenticationError, 401))
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(service.async_get_climate_settings("WAUZZZ4G7EN012345"))
+
+
+def test_climate_settings_are_none_on_other_errors():
+    service = _service(_error(ClientResponseError, 404))
+
+    assert asyncio.run(service.async_get_climate_settings("WAUZZZ4G7EN012345")) is None
+
+
+class TokenEndpoints:
+    """AudiAPI stand-in for the IDK, AZS and MBB token exchanges."""
+
+    def __init__(self):
+        self.exchanges = []
+
+    async def request(self, method, url, data, **kwargs):
+        self.exchanges.append(url)
+        # Let the other refreshes start while this one is running
+        await asyncio.sleep(0.01)
+        number = len(self.exchanges)
+        token = {
+            "access_token": "access-{}".format(number),
+            "refresh_token": "refresh-{}".format(number),
+            "expires_in": 3600,
+        }
+        return None, token
+
+
+def _logged_in_service():
+    service = AudiService(TokenEndpoints(), "DE", None, 1)
+    service._tokenEndpoint = "https://idk/token"
+    service._authorizationServerBaseURLLive = "https://azs"
+    service.mbbOAuthBaseURL = "https://mbb"
+    service._bearer_token_json = {"access_token": "idk", "refresh_token": "r"}
+    service.audiToken = {"access_token": "azs"}
+    service.vwToken = {"access_token": "mbb"}
+    service.mbboauthToken = {"refresh_token": "r"}
+    return service
+
+
+def test_concurrent_refreshes_share_one_exchange_per_token():
+    service = _logged_in_service()
+    idk, azs = service._bearer_token_json, service.audiToken
+
+    async def run():
+        return await asyncio.gather(
+            service.refresh_rejected_token(idk),
+            service.refresh_rejected_token(azs),
+            service.refresh_idk_token(),
+            service.refresh_tokens(),
+            service.refresh_mbb_token(),
+        )
+
+    new_idk, new_azs, *results = asyncio.run(run())
+
+    assert sorted(service._api.exchanges) == [
+        "https://azs/token",
+        "https://idk/token",
+        "https://mbb/mobile/oauth2/v1/token",
+    ]
+    assert new_idk is service._bearer_token_json
+    assert new_azs is service.audiToken
+    assert all(results)
+
+
+def test_refresh_after_a_finished_refresh_runs_again():
+    service = _logged_in_service()
+
+    async def run():
+        await service.refresh_mbb_token()
+        await service.refresh_mbb_token()
+
+    asyncio.run(run())
+    assert len(service._api.exchanges) == 2
+
+
+class HomeRegionApi:
+    def __init__(self, uri):
+        self.uri = uri
+        self.lookups = 0
+
+    async def get(self, url, **kwargs):
+        self.lookups += 1
+        await asyncio.sleep(0.01)
+        return {"homeRegion": {"baseUri": {"content": self.uri}}}
+
+
+def test_concurrent_chains_wait_for_the_home_region():
+    api = HomeRegionApi("https://mal-3a.prd.eu.dp.vwg-connect.com/api")
+    service = AudiService(api, "DE", None, 1)
+    vin = "WAUZZZ4G7EN012345"
+
+    async def run():
+        return await asyncio.gather(
+            service._get_home_region(vin),
+            service._get_home_region_setter(vin),
+            service._get_home_region(vin),
+        )
+
+    assert asyncio.run(run()) == [
+        "https://fal-3a.prd.eu.dp.vwg-connect.com",
+        "https://mal-3a.prd.eu.dp.vwg-connect.com",
+        "https://fal-3a.prd.eu.dp.vwg-connect.com",
+    ]
+    assert api.lookups == 1
+
+
+def test_home_region_defaults_if_the_lookup_fails():
+    service = _service(_error(ClientResponseError, 500))
+    vin = "WAUZZZ4G7EN012345"
+
+    assert asyncio.run(service._get_home_region(vin)) == "https://msg.volkswagen.de"
+    assert service._homeRegionSetter[vin] == "https://mal-1a.prd.ece.vwg-connect.com"
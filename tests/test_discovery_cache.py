@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from audiconnect import audi_services
+from audiconnect.audi_services import AudiService
+from audiconnect.discovery_cache import DiscoveryCache
+
+
+class MemoryStore:
+    def __init__(self, data=None):
+        self.data = data
+
+    async def async_load(self):
+        return self.data
+
+    async def async_save(self, data):
+        self.data = {key: dict(entry) for key, entry in data.items()}
+
+
+class Documents:
+    def __init__(self):
+        self.fetches = 0
+
+    async def fetch(self):
+        self.fetches += 1
+        return {"version": self.fetches}
+
+
+def test_invalidated_documents_are_fetched_again():
+    cache = DiscoveryCache()
+    store = MemoryStore()
+    documents = Documents()
+
+    async def run():
+        await cache.attach_store(store)
+        await cache.get("markets", documents.fetch)
+        await cache.get("openid:emea", documents.fetch)
+        await cache.invalidate("markets", "unknown")
+        assert "markets" not in store.data
+        assert "openid:emea" in store.data
+        return await cache.get("markets", documents.fetch)
+
+    assert asyncio.run(run()) == {"version": 3}
+    assert documents.fetches == 3
+
+
+class FailingLoginService(AudiService):
+    async def _login_request(self, user, password):
+        self._language = "de"
+        raise ValueError("client id rejected")
+
+
+def test_failed_login_drops_the_login_configuration(monkeypatch):
+    cache = DiscoveryCache()
+    monkeypatch.setattr(audi_services, "DISCOVERY_CACHE", cache)
+    documents = Documents()
+    service = FailingLoginService(None, "DE", None, 1)
+
+    async def run():
+        for key in ("markets", "market:DE:de", "openid:emea", "openid:na"):
+            await cache.get(key, documents.fetch)
+        with pytest.raises(ValueError):
+            await service.login_request("user", "password")
+
+    asyncio.run(run())
+    assert list(cache._entries) == ["openid:na"]
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+from .conftest import PACKAGE_PATH
+
+# Modules that must not be loaded when Home Assistant imports the
+# integration: requests and bs4 are not used at all any more, the login
+# form parser is only imported on the first login
+HEAVY_MODULES = ("requests", "bs4", "audiconnect.login_form")
+
+IMPORT_SCRIPT = """
+import sys, types
+package = types.ModuleType("audiconnect")
+package.__path__ = [{path!r}]
+sys.modules["audiconnect"] = package
+import audiconnect.audi_connect_account
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def test_import_does_not_load_heavy_modules():
+    script = IMPORT_SCRIPT.format(path=str(PACKAGE_PATH), heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
@@ -0,0 +1,160 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from audiconnect.audi_services import AudiService
+from audiconnect.login_form import LOGIN_FORM_CHUNK_SIZE, parse_login_form
+
+from .conftest import load_fixture
+
+AUTHORIZATION_ENDPOINT = "https://identity.vwgroup.io/oidc/v1/authorize"
+SIGNIN_URL = (
+    "https://identity.vwgroup.io/signin-service/v1/"
+    "09b6cbec-cd19-4589-82fd-363dfa8c24da@apps_vw-dilab_com/login/"
+)
+CSRF = "3e1b1a7c-5a8f-4a4b-9f55-2c1b8f1a6d20"
+RELAY_STATE = "d3c9d1e4a3f85c2b7e6a0f4b9c8d7e6f5a4b3c2d"
+IDENTIFIER_HMAC = "8f7c1e0d9b2a3f4e5d6c7b8a9f0e1d2c3b4a5f6e7d8c9b0a1f2e3d4c5b6a7f8e"
+AUTHENTICATE_HMAC = "5b0a6f3e2d1c0b9a8f7e6d5c4b3a2f1e0d9c8b7a6f5e4d3c2b1a0f9e8d7c6b5a"
+
+
+@pytest.fixture
+def service():
+    return AudiService(None, "DE", None, 1)
+
+
+def test_identifier_form():
+    page = load_fixture("login_identifier.html")
+    form = parse_login_form(page)
+
+    assert form.action == (
+        "/signin-service/v1/09b6cbec-cd19-4589-82fd-363dfa8c24da@apps_vw-dilab_com"
+        "/login/identifier"
+    )
+    # The email input is not hidden, the input after the form is not parsed
+    assert form.hidden_inputs == {
+        "_csrf": CSRF,
+        "relayState": RELAY_STATE,
+        "hmac": IDENTIFIER_HMAC,
+    }
+    # Parsing stopped at the end of the form, long before the end of the page
+    assert form.done
+    assert len(page) > 3 * LOGIN_FORM_CHUNK_SIZE
+
+
+def test_identifier_form_from_bytes():
+    page = load_fixture("login_identifier.html")
+
+    assert vars(parse_login_form(page.encode())) == vars(parse_login_form(page))
+
+
+def test_password_form(service):
+    page = load_fixture("login_password.html")
+    submit_url = SIGNIN_URL + "identifier"
+
+    form_data = service.get_hidden_html_input_form_data(page, {"password": "secret"})
+
+    assert form_data == {
+        "password": "secret",
+        "_csrf": CSRF,
+        "relayState": RELAY_STATE,
+        "hmac": AUTHENTICATE_HMAC,
+        "email": "user@example.com",
+        "returnUrl": "/oidc/v1/authorize?client_id=09b6cbec&scope=openid&state=a1b2",
+    }
+    assert service.get_post_url(page, submit_url) == SIGNIN_URL + "authenticate"
+
+
+def test_relative_action_is_resolved_against_the_page(service):
+    page = load_fixture("login_identifier.html")
+
+    assert (
+        service.get_post_url(page, AUTHORIZATION_ENDPOINT) == SIGNIN_URL + "identifier"
+    )
+
+
+def test_unknown_action_is_rejected(service):
+    with pytest.raises(Exception, match="Unknown form action"):
+        service.get_post_url('<form action="login"></form>', AUTHORIZATION_ENDPOINT)
+
+
+@pytest.mark.parametrize(
+    "name", ["login_identifier.html", "login_authenticate.html", "login_password.html"]
+)
+def test_same_result_as_beautifulsoup(service, name):
+    bs4 = pytest.importorskip("bs4")
+    page = load_fixture(name)
+    soup = bs4.BeautifulSoup(page, "html.parser")
+    form_tag = soup.find("form")
+    # The previous implementation collected hidden inputs of the whole page
+    expected = {
+        tag.get("name"): tag.get("value")
+        for tag in (form_tag or soup).find_all("input", attrs={"type": "hidden"})
+    }
+
+    form = parse_login_form(page)
+
+    assert form.action == (form_tag.get("action") if form_tag else None)
+    assert form.hidden_inputs == expected
+
+
+class LoginPages:
+    """AudiAPI stand-in serving the identity provider pages of a login."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, method, url, data, **kwargs):
+        # The login flow reuses the form data dict for the next form
+        self.requests.append((method, url, dict(data or {})))
+        if url == AUTHORIZATION_ENDPOINT:
+            return self._response(url), load_fixture("login_identifier.html")
+        if url.endswith("/login/identifier"):
+            return self._response(url), load_fixture("login_authenticate.html")
+        if url.endswith("/login/authenticate"):
+            return self._response(url, "https://identity.vwgroup.io/fwd1"), ""
+        if url.endswith("/fwd1"):
+            return self._response(url, "https://identity.vwgroup.io/fwd2"), ""
+        if url.endswith("/fwd2"):
+            return self._response(url, "https://identity.vwgroup.io/code"), ""
+        return self._response(url, "myaudi:///?code=auth-code&state=a1b2"), ""
+
+    @staticmethod
+    def _response(url, location=None):
+        return SimpleNamespace(
+            url=SimpleNamespace(host="identity.vwgroup.io"),
+            cookies={},
+            headers={"Location": location} if location else {},
+        )
+
+
+def test_authorize_credentials_submits_the_login_forms(service):
+    pages = LoginPages()
+    service._api = pages
+
+    code = asyncio.run(
+        service._authorize_credentials(
+            "user@example.com", "secret", AUTHORIZATION_ENDPOINT, {}, {}
+        )
+    )
+
+    assert code == "auth-code"
+    _, email_url, email_data = pages.requests[1]
+    assert email_url == SIGNIN_URL + "identifier"
+    assert email_data == {
+        "email": "user@example.com",
+        "_csrf": CSRF,
+        "relayState": RELAY_STATE,
+        "hmac": IDENTIFIER_HMAC,
+    }
+    # The password page has no form, its hmac comes from the inline script
+    _, password_url, password_data = pages.requests[2]
+    assert password_url == SIGNIN_URL + "authenticate"
+    assert password_data == {
+        "email": "user@example.com",
+        "_csrf": CSRF,
+        "relayState": RELAY_STATE,
+        "hmac": AUTHENTICATE_HMAC,
+        "password": "secret",
+    }
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from audiconnect import token_manager
+from audiconnect.token_manager import TokenManager
+
+
+class ShortLivedTokens:
+    """AudiService stand-in that issues tokens valid for expires_in seconds."""
+
+    def __init__(self, expires_in):
+        self.expires_in = expires_in
+        self.expires_at = time.time() + expires_in
+        self.refreshes = 0
+
+    def token_expiry(self, kind):
+        return self.expires_at if kind == "idk" else None
+
+    async def refresh_idk_token(self):
+        self.refreshes += 1
+        self.expires_at = time.time() + self.expires_in
+        return True
+
+
+def test_short_token_lifetime_is_not_refreshed_in_a_loop(monkeypatch):
+    monkeypatch.setattr(token_manager, "MIN_REFRESH_INTERVAL", 0.2)
+    # Lifetime below REFRESH_MARGIN, so each token is due right away
+    service = ShortLivedTokens(expires_in=60)
+
+    async def run():
+        manager = TokenManager(service)
+        manager.start()
+        await asyncio.sleep(0.5)
+        await manager.stop()
+
+    asyncio.run(run())
+    assert 1 <= service.refreshes <= 3
+
+
+def test_start_runs_in_the_given_task_factory():
+    service = ShortLivedTokens(expires_in=3600)
+    tasks = []
+
+    def create_task(coro):
+        tasks.append(asyncio.get_running_loop().create_task(coro))
+        return tasks[-1]
+
+    async def run():
+        manager = TokenManager(service)
+        manager.start(create_task)
+        # Already running, so no second task is created
+        manager.start(create_task)
+        assert manager.running
+        await manager.stop()
+        assert not manager.running
+
+    asyncio.run(run())
+    assert len(tasks) == 1 and tasks[0].cancelled()
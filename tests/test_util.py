@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from audiconnect.util import join_flight
+
+
+def test_cancelled_caller_leaves_the_flight_running():
+    flights = {}
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def run():
+        first = asyncio.ensure_future(join_flight(flights, "key", work))
+        second = asyncio.ensure_future(join_flight(flights, "key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert flights == {}
+        return result, await join_flight(flights, "key", work)
+
+    assert asyncio.run(run()) == (1, 2)